@@ -1,16 +1,34 @@
 import os
 import json as _json
 from datetime import datetime
-from flask import Flask, render_template, redirect, url_for, flash, request, session, abort, send_from_directory
+from flask import Flask, render_template, redirect, url_for, flash, request, session, abort, g, send_from_directory, stream_with_context
+from flask.sessions import SecureCookieSessionInterface
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_wtf.csrf import CSRFProtect
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import defer, joinedload, selectinload
 
 from config import Config
-from models import db, Admin, Category, Product, PriceOption, Layout, Order, SiteSetting
+from models import (db, Admin, Category, Product, PriceOption, Layout, Order, OrderNotification, SiteSetting,
+                    ORDER_DETAIL_LOADERS, ORDER_STATUS_LABELS)
 from forms import (OrderForm, LoginForm, CategoryForm, ProductForm,
-                   PriceOptionForm, LayoutForm, SettingsForm)
-from mail import send_order_email
-from telegram import send_order_telegram
+                   PriceOptionForm, LayoutForm, SettingsForm, PriceImportForm)
+from catalog_cache import get_catalog, invalidate_catalog
+from order_config import get_order_config, invalidate_order_config
+from wizard_store import load_wizard_state, pop_wizard_state, save_wizard_state
+from pricing import DELIVERY_FEE, get_price_matrix, parse_qty, quote
+from price_import import PriceImportError, apply_price_changes, parse_price_file, plan_price_changes
+from page_cache import cached_page
+from sitemap import sitemap_response
+from images import generate_derivatives, responsive_img
+from uploads import send_attachment, send_upload, upload_url
+from assets import asset_url, has_asset, send_asset
+from stats import dashboard_stats, order_count
+from instrumentation import server_timing_header
+from order_search import order_search_filter
+from order_export import EXPORT_FORMATS, PARAM_LABELS, export_filename, iter_csv, iter_xlsx, parse_date
+from migrations import upgrade_schema
+from notifications import dispatch_after_response, enqueue_order_notifications, retry_notification
 from security import (
     apply_security_headers,
     safe_save_upload,
@@ -32,6 +50,34 @@ def security_headers(response):
     return apply_security_headers(response)
 
 
+# Files sent as public/immutable must never pick up Vary: Cookie
+_NO_SESSION_ENDPOINTS = {'static', 'asset', 'upload'}
+
+
+class FileAwareSessionInterface(SecureCookieSessionInterface):
+    # Flask-Login's remember-cookie hook reads the session on every response,
+    # which alone would mark public file responses as varying by cookie.
+    def save_session(self, app, session, response):
+        if request.endpoint in _NO_SESSION_ENDPOINTS and not session.modified:
+            return
+        super().save_session(app, session, response)
+
+
+app.session_interface = FileAwareSessionInterface()
+
+
+@app.after_request
+def server_timing(response):
+    if request.endpoint in _NO_SESSION_ENDPOINTS:
+        return response
+    # Only look at a user the request already loaded; loading one here would
+    # touch the session and add Vary: Cookie to every response.
+    user = g.get('_login_user')
+    if user is not None and user.is_authenticated:
+        response.headers['Server-Timing'] = server_timing_header()
+    return response
+
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'admin_login'
@@ -43,6 +89,23 @@ def load_user(user_id):
     return db.session.get(Admin, int(user_id))
 
 
+app.add_template_global(responsive_img)
+app.add_template_global(upload_url)
+app.add_template_global(asset_url)
+app.add_template_global(has_asset)
+
+
+def save_image_upload(file_storage):
+    filename = safe_save_upload(
+        file_storage,
+        app.config['UPLOAD_FOLDER'],
+        {'jpg', 'jpeg', 'png', 'gif'},
+    )
+    if filename:
+        generate_derivatives(app.config['UPLOAD_FOLDER'], filename)
+    return filename
+
+
 @app.errorhandler(429)
 def rate_limit_exceeded(e):
     return render_template('429.html'), 429
@@ -50,35 +113,35 @@ def rate_limit_exceeded(e):
 
 @app.context_processor
 def inject_settings():
+    settings = SiteSetting.all_values()
+
     def get_setting(key, default=''):
-        return SiteSetting.get(key, default)
-    categories = Category.query.filter_by(is_active=True).order_by(Category.sort_order).all()
+        return settings.get(key, default)
     return dict(
         get_setting=get_setting,
-        nav_categories=categories,
+        nav_categories=get_catalog().categories,
         current_year=datetime.utcnow().year
     )
 
 
 @app.route('/')
+@cached_page
 def index():
-    categories = Category.query.filter_by(is_active=True).order_by(Category.sort_order).all()
-    return render_template('index.html', categories=categories)
+    return render_template('index.html', categories=get_catalog().categories)
 
 
 @app.route('/catalog')
+@cached_page
 def catalog_all():
-    categories = Category.query.filter_by(is_active=True).order_by(Category.sort_order).all()
-    products = Product.query.filter_by(is_active=True).order_by(Product.sort_order).all()
-    return render_template('catalog_all.html', categories=categories, products=products)
+    tree = get_catalog()
+    return render_template('catalog_all.html', categories=tree.categories, products=tree.products)
 
 
 @app.route('/catalog/<slug>')
+@cached_page
 def catalog(slug):
-    category = Category.query.filter_by(slug=slug, is_active=True).first_or_404()
-    products = Product.query.filter_by(category_id=category.id, is_active=True)\
-        .order_by(Product.sort_order).all()
-    return render_template('catalog.html', category=category, products=products)
+    category = get_catalog().by_slug.get(slug) or abort(404)
+    return render_template('catalog.html', category=category, products=category.products)
 
 
 @app.route('/order', methods=['GET', 'POST'])
@@ -88,7 +151,7 @@ def order():
     if form.validate_on_submit():
         file_path = safe_save_upload(
             form.file.data,
-            app.config['UPLOAD_FOLDER'],
+            app.config['ATTACHMENT_FOLDER'],
             app.config['UPLOAD_ALLOWED_EXTENSIONS'],
         ) or ''
 
@@ -102,18 +165,10 @@ def order():
             file_path=file_path,
             status='new'
         )
+        enqueue_order_notifications(new_order)
         db.session.add(new_order)
         db.session.commit()
-
-        try:
-            send_order_email(new_order)
-        except Exception as e:
-            app.logger.error(f'Failed to send email for order #{new_order.id}: {e}')
-
-        try:
-            send_order_telegram(new_order)
-        except Exception as e:
-            app.logger.error(f'Failed to send Telegram for order #{new_order.id}: {e}')
+        dispatch_after_response(new_order.notifications)
 
         flash('Ваш заказ успешно отправлен! Мы свяжемся с вами в ближайшее время.', 'success')
         return redirect(url_for('order_success'))
@@ -124,11 +179,12 @@ def order():
 @app.route('/order/product/<int:product_id>', methods=['GET', 'POST'])
 @rate_limit('order_product', 15)
 def order_product(product_id):
-    product = Product.query.get_or_404(product_id)
+    product = get_order_config(product_id) or abort(404)
     step = request.args.get('step', '1')
-    layouts = Layout.query.filter_by(product_id=product.id).order_by(Layout.sort_order).all()
-    price_options = PriceOption.query.filter_by(product_id=product.id).order_by(PriceOption.sort_order).all()
-    session_key = f'order_product_{product_id}'
+    layouts = product.layouts
+    price_options = product.price_options
+    default_layout_id = str(product.default_layout.id) if product.default_layout else ''
+    wizard_key = f'order_product_{product_id}'
     allowed_ext = app.config['UPLOAD_ALLOWED_EXTENSIONS']
     max_msg = app.config['MAX_FIELD_MESSAGE']
     max_name = app.config['MAX_FIELD_NAME']
@@ -137,8 +193,10 @@ def order_product(product_id):
     max_addr = app.config['MAX_FIELD_ADDRESS']
     max_params_len = app.config['MAX_PARAMS_JSON_LENGTH']
 
-    skip_layout_osnastka = product.category.slug in ('faksimile', 'ottisk')
-    skip_layout = not layouts
+    skip_layout_osnastka = product.skip_layout_osnastka
+    # Step data used to be kept in the cookie itself; drop what older sessions still carry
+    for key in [k for k in session if k.startswith('order_product_')]:
+        session.pop(key)
 
     if request.method == 'POST':
         if step == '1':
@@ -147,37 +205,38 @@ def order_product(product_id):
             params['message'] = truncate_str(request.form.get('message', ''), 2000)
             file_path = safe_save_upload(
                 request.files.get('file_step1'),
-                app.config['UPLOAD_FOLDER'],
+                app.config['ATTACHMENT_FOLDER'],
                 allowed_ext,
             ) or ''
-            session[session_key] = {'params': params, 'file_path': file_path}
             if skip_layout_osnastka:
-                step_data = {'layout_id': str(layouts[0].id) if layouts else '', 'params': params, 'file_path': file_path}
-                session[session_key] = step_data
+                step_data = {'layout_id': default_layout_id, 'params': params, 'file_path': file_path}
+                save_wizard_state(wizard_key, step_data)
                 return redirect(url_for('order_product', product_id=product_id, step=3, layout_id=step_data.get('layout_id') or ''))
+            save_wizard_state(wizard_key, {'params': params, 'file_path': file_path})
             if not layouts:
-                session[session_key] = {'params': params, 'file_path': file_path}
                 return redirect(url_for('order_product', product_id=product_id, step=3))
             return redirect(url_for('order_product', product_id=product_id, step=2))
         elif step == '2':
-            step_data = session.get(session_key, {})
-            raw_layout = request.form.get('layout_id') or (str(layouts[0].id) if layouts else '')
-            if layout_belongs_to_product(raw_layout, product.id, layouts):
+            step_data = load_wizard_state(wizard_key)
+            raw_layout = request.form.get('layout_id') or default_layout_id
+            if layout_belongs_to_product(raw_layout, product.id, product.layouts_by_id):
                 step_data['layout_id'] = raw_layout
             else:
-                step_data['layout_id'] = str(layouts[0].id) if layouts else ''
-            session[session_key] = step_data
+                step_data['layout_id'] = default_layout_id
+            save_wizard_state(wizard_key, step_data)
             return redirect(url_for('order_product', product_id=product_id, step=3, layout_id=step_data['layout_id']))
         elif step == '3':
-            step_data = session.pop(session_key, {})
+            step_data = pop_wizard_state(wizard_key)
             layout_id = request.form.get('layout_id') or step_data.get('layout_id')
-            if layout_id and not layout_belongs_to_product(layout_id, product.id, layouts):
-                layout_id = str(layouts[0].id) if layouts else None
+            if layout_id and not layout_belongs_to_product(layout_id, product.id, product.layouts_by_id):
+                layout_id = default_layout_id or None
+            default_price_option_id = str(product.default_price_option.id) if product.default_price_option else None
             price_option_id = request.form.get('price_option_id')
-            if skip_layout_osnastka and not price_option_id and price_options:
-                price_option_id = str(price_options[0].id)
-            if price_option_id and not price_option_belongs_to_product(price_option_id, product.id, price_options):
-                price_option_id = str(price_options[0].id) if price_options else None
+            if skip_layout_osnastka and not price_option_id:
+                price_option_id = default_price_option_id
+            if price_option_id and not price_option_belongs_to_product(price_option_id, product.id,
+                                                                       product.price_options_by_id):
+                price_option_id = default_price_option_id
 
             name = truncate_str(request.form.get('name'), max_name)
             phone = truncate_str(request.form.get('phone'), max_phone)
@@ -191,22 +250,20 @@ def order_product(product_id):
 
             if not name or not phone:
                 flash('Укажите имя и телефон.', 'error')
-                session[session_key] = step_data
+                save_wizard_state(wizard_key, step_data)
                 return redirect(url_for('order_product', product_id=product_id, step=3))
 
-            layout_obj = Layout.query.get(int(layout_id)) if layout_id and str(layout_id).isdigit() else None
-            po = PriceOption.query.get(int(price_option_id)) if price_option_id and str(price_option_id).isdigit() else None
-            layout_price = 0 if (skip_layout_osnastka or not layouts) else (layout_obj.price if layout_obj else 750)
-            po_price = po.price_normal if po else 0
-            qty = max(1, int(step_data.get('params', {}).get('qty', 1) or 1))
             needs_delivery = request.form.get('needs_delivery') == 'on'
-            delivery_fee = 500 if needs_delivery else 0
-            total = (layout_price + po_price) * qty + delivery_fee
+            total = quote(get_price_matrix(product.id),
+                          int(layout_id) if layout_id else None,
+                          int(price_option_id) if price_option_id else None,
+                          step_data.get('params', {}).get('qty'),
+                          needs_delivery)['total']
 
             file_path = step_data.get('file_path', '')
             file_path_step3 = safe_save_upload(
                 request.files.get('file'),
-                app.config['UPLOAD_FOLDER'],
+                app.config['ATTACHMENT_FOLDER'],
                 allowed_ext,
             ) or ''
 
@@ -232,27 +289,25 @@ def order_product(product_id):
                 delivery_datetime=delivery_datetime,
                 delivery_address=delivery_address,
             )
+            enqueue_order_notifications(new_order)
             db.session.add(new_order)
             db.session.commit()
-
-            try:
-                send_order_email(new_order)
-            except Exception as e:
-                app.logger.error(f'Failed to send email for order #{new_order.id}: {e}')
-
-            try:
-                send_order_telegram(new_order)
-            except Exception as e:
-                app.logger.error(f'Failed to send Telegram for order #{new_order.id}: {e}')
+            dispatch_after_response(new_order.notifications)
 
             flash('Ваш заказ успешно отправлен! Мы свяжемся с вами в ближайшее время.', 'success')
             return redirect(url_for('order_success'))
 
     layout_id = request.args.get('layout_id')
-    selected_layout = Layout.query.get(layout_id) if layout_id else (layouts[0] if layouts else None)
+    if layout_id:
+        selected_layout = product.layouts_by_id.get(int(layout_id)) if layout_id.isdigit() else None
+    else:
+        selected_layout = product.default_layout
 
-    session_data = session.get(session_key, {})
-    qty = max(1, int(session_data.get('params', {}).get('qty', 1) or 1))
+    session_data = load_wizard_state(wizard_key)
+    qty = parse_qty(session_data.get('params', {}).get('qty'))
+    price_matrix = get_price_matrix(product.id)
+    initial_quote = quote(price_matrix, selected_layout.id if selected_layout else None,
+                          price_matrix.default_price_option_id, qty)
 
     return render_template('order_product.html',
                            product=product,
@@ -262,31 +317,58 @@ def order_product(product_id):
                            selected_layout=selected_layout,
                            layout_id=layout_id,
                            qty=qty,
-                           skip_layout=not layouts,
+                           price_matrix=price_matrix,
+                           initial_quote=initial_quote,
+                           delivery_fee=DELIVERY_FEE,
+                           skip_layout=product.skip_layout,
                            skip_layout_osnastka=skip_layout_osnastka)
 
 
+@app.route('/api/quote')
+def api_quote():
+    matrix = get_price_matrix(request.args.get('product_id', type=int)) or abort(404)
+    if any(k in request.args for k in ('layout_id', 'price_option_id', 'qty', 'delivery')):
+        result = quote(matrix,
+                       request.args.get('layout_id', type=int),
+                       request.args.get('price_option_id', type=int),
+                       request.args.get('qty'),
+                       request.args.get('delivery', '') in ('1', 'true', 'on'))
+        body = _json.dumps(result, separators=(',', ':'), sort_keys=True)
+        etag = (f'{matrix.etag}-{result["layout_id"] or 0}-{result["price_option_id"] or 0}'
+                f'-{result["qty"]}-{1 if result["delivery_fee"] else 0}')
+    else:
+        body, etag = matrix.json, matrix.etag
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=60, must-revalidate'
+    return response.make_conditional(request)
+
+
 @app.route('/order/success')
 def order_success():
     return render_template('order_success.html')
 
 
 @app.route('/contacts')
+@cached_page
 def contacts():
     return render_template('contacts.html')
 
 
 @app.route('/delivery')
+@cached_page
 def delivery():
     return render_template('delivery.html')
 
 
 @app.route('/about')
+@cached_page
 def about():
     return render_template('about.html')
 
 
 @app.route('/policy')
+@cached_page
 def policy():
     return render_template('policy.html')
 
@@ -296,12 +378,18 @@ def favicon():
     return send_from_directory(app.static_folder, 'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
 
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    return send_asset(filename)
+
+
 @app.route('/robots.txt')
 def robots_txt():
     sitemap_url = url_for('sitemap_xml', _external=True)
     content = f"""User-agent: *
 Allow: /
 Disallow: /admin/
+Allow: /order/product/
 Disallow: /order/
 
 Sitemap: {sitemap_url}
@@ -310,37 +398,19 @@ Host: {request.host}
     return app.response_class(content, mimetype='text/plain')
 
 
+@app.route('/uploads/<path:filename>')
+def upload(filename):
+    return send_upload(filename)
+
+
 @app.route('/sitemap.xml')
 def sitemap_xml():
-    from datetime import date
-    today = date.today().isoformat()
-    base = request.url_root.rstrip('/')
-
-    urls = [
-        {'loc': base + '/', 'priority': '1.0', 'changefreq': 'weekly'},
-        {'loc': base + url_for('catalog_all'), 'priority': '0.9', 'changefreq': 'weekly'},
-        {'loc': base + url_for('about'), 'priority': '0.7', 'changefreq': 'monthly'},
-        {'loc': base + url_for('contacts'), 'priority': '0.7', 'changefreq': 'monthly'},
-        {'loc': base + url_for('delivery'), 'priority': '0.7', 'changefreq': 'monthly'},
-        {'loc': base + url_for('policy'), 'priority': '0.3', 'changefreq': 'yearly'},
-    ]
-
-    categories = Category.query.filter_by(is_active=True).all()
-    for cat in categories:
-        urls.append({'loc': base + url_for('catalog', slug=cat.slug), 'priority': '0.8', 'changefreq': 'weekly'})
-
-    xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    for u in urls:
-        xml += '  <url>\n'
-        xml += f'    <loc>{u["loc"]}</loc>\n'
-        xml += f'    <lastmod>{today}</lastmod>\n'
-        xml += f'    <changefreq>{u["changefreq"]}</changefreq>\n'
-        xml += f'    <priority>{u["priority"]}</priority>\n'
-        xml += '  </url>\n'
-    xml += '</urlset>'
-
-    return app.response_class(xml, mimetype='application/xml')
+    return sitemap_response()
+
+
+@app.route('/sitemap.xml.gz')
+def sitemap_xml_gz():
+    return sitemap_response(gzipped=True)
 
 
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -368,17 +438,18 @@ def admin_logout():
 @app.route('/admin')
 @login_required
 def admin_dashboard():
-    orders_count = Order.query.count()
-    new_orders = Order.query.filter_by(status='new').count()
+    stats = dashboard_stats()
     products_count = Product.query.count()
     categories_count = Category.query.count()
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
+    recent_orders = (Order.query.options(joinedload(Order.product))
+                     .order_by(Order.created_at.desc(), Order.id.desc()).limit(5).all())
     return render_template('admin/dashboard.html',
-                           orders_count=orders_count,
-                           new_orders=new_orders,
+                           orders_count=stats['orders_total'],
+                           new_orders=stats['statuses'].get('new', 0),
                            products_count=products_count,
                            categories_count=categories_count,
-                           recent_orders=recent_orders)
+                           recent_orders=recent_orders,
+                           stats=stats)
 
 
 @app.route('/admin/categories')
@@ -393,11 +464,7 @@ def admin_categories():
 def admin_category_add():
     form = CategoryForm()
     if form.validate_on_submit():
-        image_path = safe_save_upload(
-            form.image.data,
-            app.config['UPLOAD_FOLDER'],
-            {'jpg', 'jpeg', 'png', 'gif'},
-        ) or ''
+        image_path = save_image_upload(form.image.data) or ''
         cat = Category(
             name=form.name.data,
             slug=form.slug.data,
@@ -409,6 +476,7 @@ def admin_category_add():
         )
         db.session.add(cat)
         db.session.commit()
+        invalidate_catalog()
         flash('Категория добавлена', 'success')
         return redirect(url_for('admin_categories'))
     return render_template('admin/category_form.html', form=form, title='Добавить категорию')
@@ -420,11 +488,7 @@ def admin_category_edit(id):
     cat = db.session.get(Category, id) or abort(404)
     form = CategoryForm(obj=cat)
     if form.validate_on_submit():
-        up = safe_save_upload(
-            form.image.data,
-            app.config['UPLOAD_FOLDER'],
-            {'jpg', 'jpeg', 'png', 'gif'},
-        )
+        up = save_image_upload(form.image.data)
         if up:
             cat.image = up
         cat.name = form.name.data
@@ -434,6 +498,8 @@ def admin_category_edit(id):
         cat.sort_order = form.sort_order.data or 0
         cat.is_active = form.is_active.data
         db.session.commit()
+        invalidate_catalog()
+        invalidate_order_config()
         flash('Категория обновлена', 'success')
         return redirect(url_for('admin_categories'))
     return render_template('admin/category_form.html', form=form, title='Редактировать категорию', category=cat)
@@ -445,6 +511,8 @@ def admin_category_delete(id):
     cat = db.session.get(Category, id) or abort(404)
     db.session.delete(cat)
     db.session.commit()
+    invalidate_catalog()
+    invalidate_order_config()
     flash('Категория удалена', 'success')
     return redirect(url_for('admin_categories'))
 
@@ -452,7 +520,9 @@ def admin_category_delete(id):
 @app.route('/admin/products')
 @login_required
 def admin_products():
-    products = Product.query.order_by(Product.sort_order).all()
+    products = (Product.query
+                .options(joinedload(Product.category), selectinload(Product.price_options))
+                .order_by(Product.sort_order).all())
     return render_template('admin/products.html', products=products)
 
 
@@ -463,11 +533,7 @@ def admin_product_add():
     form.category_id.choices = [(c.id, c.name) for c in
                                  Category.query.order_by(Category.sort_order).all()]
     if form.validate_on_submit():
-        image_path = safe_save_upload(
-            form.image.data,
-            app.config['UPLOAD_FOLDER'],
-            {'jpg', 'jpeg', 'png', 'gif'},
-        ) or ''
+        image_path = save_image_upload(form.image.data) or ''
         prod = Product(
             category_id=form.category_id.data,
             name=form.name.data,
@@ -478,6 +544,8 @@ def admin_product_add():
         )
         db.session.add(prod)
         db.session.commit()
+        invalidate_catalog()
+        invalidate_order_config()
         flash('Товар добавлен', 'success')
         return redirect(url_for('admin_products'))
     return render_template('admin/product_form.html', form=form, title='Добавить товар')
@@ -486,16 +554,13 @@ def admin_product_add():
 @app.route('/admin/products/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def admin_product_edit(id):
-    prod = db.session.get(Product, id) or abort(404)
+    prod = db.session.get(Product, id, options=[selectinload(Product.layouts),
+                                                 selectinload(Product.price_options)]) or abort(404)
     form = ProductForm(obj=prod)
     form.category_id.choices = [(c.id, c.name) for c in
                                  Category.query.order_by(Category.sort_order).all()]
     if form.validate_on_submit():
-        up = safe_save_upload(
-            form.image.data,
-            app.config['UPLOAD_FOLDER'],
-            {'jpg', 'jpeg', 'png', 'gif'},
-        )
+        up = save_image_upload(form.image.data)
         if up:
             prod.image = up
         prod.category_id = form.category_id.data
@@ -504,6 +569,8 @@ def admin_product_edit(id):
         prod.sort_order = form.sort_order.data or 0
         prod.is_active = form.is_active.data
         db.session.commit()
+        invalidate_catalog()
+        invalidate_order_config()
         flash('Товар обновлён', 'success')
         return redirect(url_for('admin_products'))
     return render_template('admin/product_form.html', form=form, title='Редактировать товар',
@@ -516,6 +583,8 @@ def admin_product_delete(id):
     prod = db.session.get(Product, id) or abort(404)
     db.session.delete(prod)
     db.session.commit()
+    invalidate_catalog()
+    invalidate_order_config()
     flash('Товар удалён', 'success')
     return redirect(url_for('admin_products'))
 
@@ -526,11 +595,7 @@ def admin_price_add(product_id):
     prod = db.session.get(Product, product_id) or abort(404)
     form = PriceOptionForm()
     if form.validate_on_submit():
-        image_path = safe_save_upload(
-            form.image.data,
-            app.config['UPLOAD_FOLDER'],
-            {'jpg', 'jpeg', 'png', 'gif'},
-        ) or ''
+        image_path = save_image_upload(form.image.data) or ''
         po = PriceOption(
             product_id=prod.id,
             osnastka_type=form.osnastka_type.data,
@@ -541,6 +606,7 @@ def admin_price_add(product_id):
         )
         db.session.add(po)
         db.session.commit()
+        invalidate_order_config()
         flash('Цена добавлена', 'success')
         return redirect(url_for('admin_product_edit', id=prod.id))
     return render_template('admin/price_form.html', form=form, product=prod,
@@ -553,11 +619,7 @@ def admin_price_edit(id):
     po = db.session.get(PriceOption, id) or abort(404)
     form = PriceOptionForm(obj=po)
     if form.validate_on_submit():
-        up = safe_save_upload(
-            form.image.data,
-            app.config['UPLOAD_FOLDER'],
-            {'jpg', 'jpeg', 'png', 'gif'},
-        )
+        up = save_image_upload(form.image.data)
         if up:
             po.image = up
         po.osnastka_type = form.osnastka_type.data
@@ -565,6 +627,7 @@ def admin_price_edit(id):
         po.price_normal = form.price_normal.data
         po.sort_order = form.sort_order.data or 0
         db.session.commit()
+        invalidate_order_config()
         flash('Цена обновлена', 'success')
         return redirect(url_for('admin_product_edit', id=po.product_id))
     return render_template('admin/price_form.html', form=form, product=po.product,
@@ -578,21 +641,45 @@ def admin_price_delete(id):
     product_id = po.product_id
     db.session.delete(po)
     db.session.commit()
+    invalidate_order_config()
     flash('Цена удалена', 'success')
     return redirect(url_for('admin_product_edit', id=product_id))
 
 
+@app.route('/admin/prices/import', methods=['GET', 'POST'])
+@login_required
+def admin_price_import():
+    form = PriceImportForm()
+    changes, errors = None, []
+    if form.validate_on_submit():
+        if not form.file.data and not form.rows.data:
+            flash('Выберите файл с ценами', 'error')
+            return redirect(url_for('admin_price_import'))
+        try:
+            if form.file.data:
+                rows = parse_price_file(form.file.data.filename or '', form.file.data.read())
+            else:
+                rows = _json.loads(form.rows.data or '[]')
+        except (PriceImportError, ValueError) as e:
+            flash(str(e), 'error')
+            return redirect(url_for('admin_price_import'))
+        changes, errors = plan_price_changes(rows)
+        if not form.file.data and not errors:
+            if changes:
+                apply_price_changes(changes)
+            flash(f'Обновлено цен: {len(changes)}', 'success')
+            return redirect(url_for('admin_products'))
+        form.rows.data = _json.dumps(rows, ensure_ascii=False)
+    return render_template('admin/price_import.html', form=form, changes=changes, errors=errors)
+
+
 @app.route('/admin/products/<int:product_id>/layouts/add', methods=['GET', 'POST'])
 @login_required
 def admin_layout_add(product_id):
     prod = db.session.get(Product, product_id) or abort(404)
     form = LayoutForm()
     if form.validate_on_submit():
-        image_path = safe_save_upload(
-            form.image.data,
-            app.config['UPLOAD_FOLDER'],
-            {'jpg', 'jpeg', 'png', 'gif'},
-        ) or ''
+        image_path = save_image_upload(form.image.data) or ''
         layout = Layout(
             product_id=prod.id,
             name=form.name.data,
@@ -602,6 +689,7 @@ def admin_layout_add(product_id):
         )
         db.session.add(layout)
         db.session.commit()
+        invalidate_order_config()
         flash('Макет добавлен', 'success')
         return redirect(url_for('admin_product_edit', id=prod.id))
     return render_template('admin/layout_form.html', form=form, product=prod, title='Добавить макет')
@@ -613,17 +701,14 @@ def admin_layout_edit(id):
     layout = db.session.get(Layout, id) or abort(404)
     form = LayoutForm(obj=layout)
     if form.validate_on_submit():
-        up = safe_save_upload(
-            form.image.data,
-            app.config['UPLOAD_FOLDER'],
-            {'jpg', 'jpeg', 'png', 'gif'},
-        )
+        up = save_image_upload(form.image.data)
         if up:
             layout.image = up
         layout.name = form.name.data
         layout.price = float(form.price.data) if form.price.data is not None else 750
         layout.sort_order = form.sort_order.data or 0
         db.session.commit()
+        invalidate_order_config()
         flash('Макет обновлён', 'success')
         return redirect(url_for('admin_product_edit', id=layout.product_id))
     return render_template('admin/layout_form.html', form=form, product=layout.product,
@@ -637,6 +722,7 @@ def admin_layout_delete(id):
     product_id = layout.product_id
     db.session.delete(layout)
     db.session.commit()
+    invalidate_order_config()
     flash('Макет удалён', 'success')
     return redirect(url_for('admin_product_edit', id=product_id))
 
@@ -644,41 +730,107 @@ def admin_layout_delete(id):
 _ALLOWED_ORDER_STATUSES = ('new', 'in_progress', 'done', 'cancelled')
 
 
+def _encode_order_cursor(order):
+    return f'{order.created_at.isoformat()}_{order.id}'
+
+
+def _decode_order_cursor(raw):
+    try:
+        created, order_id = raw.rsplit('_', 1)
+        return datetime.fromisoformat(created), int(order_id)
+    except (ValueError, AttributeError):
+        return None
+
+
 @app.route('/admin/orders')
 @login_required
 def admin_orders():
     status_filter = request.args.get('status', '')
     if status_filter and status_filter not in _ALLOWED_ORDER_STATUSES:
         status_filter = ''
-    query = Order.query.order_by(Order.created_at.desc())
+    search_query = request.args.get('q', '').strip()[:100]
+    page_size = app.config['ADMIN_ORDERS_PAGE_SIZE']
+    after = _decode_order_cursor(request.args.get('after'))
+    before = None if after else _decode_order_cursor(request.args.get('before'))
+
+    query = Order.query.options(
+        defer(Order.message),
+        defer(Order.params_json),
+        defer(Order.delivery_address),
+        defer(Order.search_text),
+        joinedload(Order.product),
+    )
     if status_filter:
         query = query.filter_by(status=status_filter)
-    orders = query.all()
+    search_filter = order_search_filter(search_query)
+    if search_filter is not None:
+        query = query.filter(search_filter)
+    if after:
+        query = query.filter(or_(Order.created_at < after[0],
+                                 and_(Order.created_at == after[0], Order.id < after[1])))
+        query = query.order_by(Order.created_at.desc(), Order.id.desc())
+    elif before:
+        query = query.filter(or_(Order.created_at > before[0],
+                                 and_(Order.created_at == before[0], Order.id > before[1])))
+        query = query.order_by(Order.created_at.asc(), Order.id.asc())
+    else:
+        query = query.order_by(Order.created_at.desc(), Order.id.desc())
+
+    orders = query.limit(page_size + 1).all()
+    has_more = len(orders) > page_size
+    orders = orders[:page_size]
+    if before:
+        orders.reverse()
+
+    next_cursor = prev_cursor = None
+    if orders:
+        if has_more or before:
+            next_cursor = _encode_order_cursor(orders[-1])
+        if after or (before and has_more):
+            prev_cursor = _encode_order_cursor(orders[0])
+
     return render_template('admin/orders.html', orders=orders,
-                           status_filter=status_filter)
+                           status_filter=status_filter,
+                           search_query=search_query,
+                           next_cursor=next_cursor,
+                           prev_cursor=prev_cursor,
+                           status_filter_label=ORDER_STATUS_LABELS.get(status_filter, ''),
+                           export_formats=EXPORT_FORMATS,
+                           total_count=None if search_query else order_count(status_filter))
 
 
-PARAM_LABELS = {
-    'ooo': 'ООО (наименование)',
-    'ogrn': 'ОГРН',
-    'ogrnip': 'ОГРНИП',
-    'inn': 'ИНН',
-    'city': 'Город',
-    'size': 'Размер (мм)',
-    'qty': 'Количество (шт)',
-    'fio': 'ФИО',
-    'spec': 'Специальность',
-    'text': 'Текст штампа',
-    'lines': 'Кол-во строк',
-    'message': 'Комментарий',
-}
+@app.route('/admin/orders/export')
+@login_required
+def admin_orders_export():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    status = request.args.get('status', '')
+    if status not in _ALLOWED_ORDER_STATUSES:
+        status = None
+    date_from = parse_date(request.args.get('date_from'))
+    date_to = parse_date(request.args.get('date_to'))
+
+    if fmt == 'xlsx':
+        body = iter_xlsx(date_from, date_to, status)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body = (chunk.encode('utf-8') for chunk in iter_csv(date_from, date_to, status))
+        mimetype = 'text/csv'
+    response = app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{export_filename(fmt, date_from, date_to, status)}"'
+    )
+    response.headers['Cache-Control'] = 'no-store'
+    # Let nginx pass chunks through instead of buffering the whole file
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @app.route('/admin/orders/<int:id>')
 @login_required
 def admin_order_detail(id):
-    import json as _json
-    order = db.session.get(Order, id) or abort(404)
+    order = db.session.get(Order, id, options=ORDER_DETAIL_LOADERS) or abort(404)
     order_params = {}
     if order.params_json:
         try:
@@ -701,6 +853,23 @@ def admin_order_status(id):
     return redirect(url_for('admin_order_detail', id=id))
 
 
+@app.route('/admin/uploads/<path:filename>')
+@login_required
+def admin_upload(filename):
+    return send_attachment(filename)
+
+
+@app.route('/admin/notifications/<int:id>/retry', methods=['POST'])
+@login_required
+def admin_notification_retry(id):
+    notification = db.session.get(OrderNotification, id) or abort(404)
+    if notification.status != 'sent':
+        retry_notification(notification)
+        dispatch_after_response([notification])
+        flash('Уведомление поставлено в очередь', 'success')
+    return redirect(url_for('admin_order_detail', id=notification.order_id))
+
+
 @app.route('/admin/settings', methods=['GET', 'POST'])
 @login_required
 def admin_settings():
@@ -714,13 +883,14 @@ def admin_settings():
         form.city.data = SiteSetting.get('city', 'Тюмень')
 
     if form.validate_on_submit():
-        SiteSetting.set('phone', form.phone.data)
-        SiteSetting.set('email', form.email.data)
-        SiteSetting.set('address', form.address.data)
-        SiteSetting.set('work_hours', form.work_hours.data)
-        SiteSetting.set('company_name', form.company_name.data)
-        SiteSetting.set('city', form.city.data)
-        
+        values = {
+            'phone': form.phone.data,
+            'email': form.email.data,
+            'address': form.address.data,
+            'work_hours': form.work_hours.data,
+            'company_name': form.company_name.data,
+            'city': form.city.data,
+        }
         if form.logo.data:
             logo_path = safe_save_upload(
                 form.logo.data,
@@ -728,8 +898,9 @@ def admin_settings():
                 {'svg', 'png', 'jpg', 'jpeg'}
             )
             if logo_path:
-                SiteSetting.set('logo_path', logo_path)
-        
+                values['logo_path'] = logo_path
+        SiteSetting.set_many(values)
+
         flash('Настройки сохранены', 'success')
         return redirect(url_for('admin_settings'))
 
@@ -738,9 +909,12 @@ def admin_settings():
 
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(app.config['ATTACHMENT_FOLDER'], exist_ok=True)
+os.makedirs(app.config['CACHE_STAMP_FOLDER'], exist_ok=True)
 
 with app.app_context():
-    db.create_all()
+    if app.config['AUTO_MIGRATE']:
+        upgrade_schema()
     admin_username = os.getenv('ADMIN_USERNAME', '').strip()
     admin_password = os.getenv('ADMIN_PASSWORD', '')
     if not Admin.query.first() and admin_username and admin_password:
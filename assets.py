@@ -0,0 +1,53 @@
+import json
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory, url_for, abort
+
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+_manifest = None
+
+
+def _dist_folder():
+    return current_app.config['ASSET_DIST_FOLDER']
+
+
+def _load_manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(os.path.join(_dist_folder(), 'manifest.json'), 'r', encoding='utf-8') as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def has_asset(name):
+    return name in _load_manifest()
+
+
+def asset_url(name):
+    hashed = _load_manifest().get(name)
+    if hashed is None:
+        return url_for('static', filename=name)
+    return url_for('asset', filename=hashed)
+
+
+def send_asset(filename):
+    if filename not in _load_manifest().values():
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    accepted = request.accept_encodings
+    dist = _dist_folder()
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.isfile(os.path.join(dist, filename + suffix)):
+            response = send_from_directory(dist, filename + suffix, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist, filename, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import argparse
+import statistics
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ('index', 'catalog_all', 'catalog', 'order_step1', 'order_step2', 'order_step3',
+             'sitemap', 'admin_orders')
+
+
+class AllowAll:
+    def hit(self, key, limit, window):
+        return True
+
+
+def setup(database_url, seed, orders):
+    # Config is read at import time, so the environment has to be ready first
+    tmp = tempfile.mkdtemp(prefix='pechati-bench-')
+    os.environ['DATABASE_URL'] = database_url or f'sqlite:///{os.path.join(tmp, "bench.sqlite3")}'
+    os.environ['CACHE_STAMP_FOLDER'] = os.path.join(tmp, 'cache')
+    os.environ['WIZARD_STORE_DB'] = os.path.join(tmp, 'wizard.sqlite3')
+    os.environ.setdefault('ADMIN_USERNAME', 'bench')
+    os.environ.setdefault('ADMIN_PASSWORD', 'bench')
+
+    import security
+    import notifications
+    from app import app
+    from models import db, Order, Product
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    security._rate_store_instance = AllowAll()
+    notifications.CHANNELS = {name: (lambda order: True) for name in notifications.CHANNELS}
+
+    if seed or not database_url:
+        import seed as seed_module
+        from stats import rebuild_stats
+
+        seed_module.seed()
+        with app.app_context():
+            product_ids = [p.id for p in Product.query.all()]
+            rng = random.Random(42)
+            batch = []
+            for i in range(orders):
+                order = Order(
+                    product_id=rng.choice(product_ids), name=f'Клиент {i}',
+                    phone=f'+7 9{rng.randrange(10 ** 9):09d}', email=f'client{i}@example.com',
+                    params_json=json.dumps({'inn': f'{rng.randrange(10 ** 10):010d}'}),
+                    status=rng.choice(('new', 'in_progress', 'done', 'cancelled')),
+                    total_price=float(rng.randrange(500, 5000)),
+                )
+                row = {c.name: getattr(order, c.name) for c in Order.__table__.columns if c.name != 'id'}
+                row['created_at'] = row['created_at'] or _created_at(rng)
+                row['search_text'] = order.build_search_text()
+                batch.append(row)
+                if len(batch) == 1000:
+                    db.session.execute(Order.__table__.insert(), batch)
+                    batch = []
+            if batch:
+                db.session.execute(Order.__table__.insert(), batch)
+            db.session.commit()
+            rebuild_stats()
+    return app
+
+
+def _created_at(rng):
+    from datetime import datetime, timedelta
+    return datetime.utcnow() - timedelta(minutes=rng.randrange(60 * 24 * 365))
+
+
+def _check(resp, name):
+    if resp.status_code >= 400:
+        raise RuntimeError(f'{name}: HTTP {resp.status_code}')
+    return resp
+
+
+def build_scenarios(app):
+    from models import Admin, Category, Product
+
+    with app.app_context():
+        slug = Category.query.filter_by(is_active=True).order_by(Category.sort_order).first().slug
+        product = (Product.query.filter_by(is_active=True)
+                   .filter(Product.layouts.any()).order_by(Product.id).first())
+        product_id = product.id
+        layout_id = product.layouts[0].id
+        price_option_id = product.price_options[0].id if product.price_options else ''
+        admin_username = Admin.query.first().username
+
+    public = app.test_client()
+    wizard = app.test_client()
+    admin = app.test_client()
+    with admin.session_transaction() as sess:
+        with app.app_context():
+            sess['_user_id'] = str(Admin.query.filter_by(username=admin_username).first().id)
+        sess['_fresh'] = True
+
+    base = f'/order/product/{product_id}'
+
+    def step1():
+        _check(wizard.get(f'{base}?step=1'), 'order_step1')
+        _check(wizard.post(f'{base}?step=1', data={'param_inn': '7701234567', 'param_qty': '2'}), 'order_step1')
+
+    def step2():
+        _check(wizard.get(f'{base}?step=2'), 'order_step2')
+        _check(wizard.post(f'{base}?step=2', data={'layout_id': layout_id}), 'order_step2')
+
+    def step3():
+        _check(wizard.get(f'{base}?step=3&layout_id={layout_id}'), 'order_step3')
+        _check(wizard.post(f'{base}?step=3', data={
+            'layout_id': layout_id, 'price_option_id': price_option_id,
+            'name': 'Бенчмарк', 'phone': '+7 900 000-00-00',
+        }), 'order_step3')
+
+    return {
+        'index': lambda: _check(public.get('/'), 'index'),
+        'catalog_all': lambda: _check(public.get('/catalog'), 'catalog_all'),
+        'catalog': lambda: _check(public.get(f'/catalog/{slug}'), 'catalog'),
+        'order_step1': step1,
+        'order_step2': step2,
+        'order_step3': step3,
+        'sitemap': lambda: _check(public.get('/sitemap.xml'), 'sitemap'),
+        'admin_orders': lambda: _check(admin.get('/admin/orders'), 'admin_orders'),
+    }
+
+
+def _summary(samples, wall):
+    q = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / wall, 1),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(q[49] * 1000, 3),
+        'p95_ms': round(q[94] * 1000, 3),
+        'p99_ms': round(q[98] * 1000, 3),
+    }
+
+
+def run(app, iterations, warmup, only):
+    scenarios = build_scenarios(app)
+    names = [n for n in SCENARIOS if not only or n in only]
+    wizard = [n for n in ('order_step1', 'order_step2', 'order_step3') if n in names]
+    samples = {n: [] for n in names}
+    wall = {n: 0.0 for n in names}
+
+    def timed(name, record):
+        started = time.perf_counter()
+        scenarios[name]()
+        elapsed = time.perf_counter() - started
+        if record:
+            samples[name].append(elapsed)
+            wall[name] += elapsed
+
+    for i in range(warmup + iterations):
+        record = i >= warmup
+        for name in names:
+            if name not in wizard:
+                timed(name, record)
+        # the wizard steps share one session, so they run in order every round
+        for name in ('order_step1', 'order_step2', 'order_step3'):
+            if name in wizard:
+                timed(name, record)
+            elif wizard:
+                scenarios[name]()
+    return {name: _summary(samples[name], wall[name]) for name in names}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f'{"scenario":14} {"p95 ms":>18} {"rps":>18}')
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f'{name:14} {current["p95_ms"]:>8.2f} (no baseline)')
+            continue
+        p95_delta = (current['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0
+        rps_delta = (current['throughput_rps'] - base['throughput_rps']) / base['throughput_rps'] * 100 \
+            if base['throughput_rps'] else 0
+        flag = ''
+        if p95_delta > threshold or -rps_delta > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:14} {current["p95_ms"]:>8.2f} ({p95_delta:+6.1f}%) '
+              f'{current["throughput_rps"]:>8.1f} ({rps_delta:+6.1f}%){flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark storefront, order wizard and admin views in-process against a seeded database'
+    )
+    parser.add_argument('--database-url',
+                        help='Database to run against; default is a fresh temporary SQLite file')
+    parser.add_argument('--seed', action='store_true',
+                        help='Re-seed --database-url first (drops all tables!)')
+    parser.add_argument('--orders', type=int, default=5000, help='Orders to generate when seeding')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--only', nargs='*', choices=SCENARIOS, help='Run a subset of scenarios')
+    parser.add_argument('--no-page-cache', action='store_true', help='Disable the rendered page cache')
+    parser.add_argument('--save', metavar='FILE', help='Write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='Compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent change in p95 or throughput that counts as a regression')
+    args = parser.parse_args()
+
+    app = setup(args.database_url, args.seed, args.orders)
+    if args.no_page_cache:
+        app.config['PAGE_CACHE_ENABLED'] = False
+    results = run(app, args.iterations, args.warmup, args.only)
+
+    report = {
+        'meta': {
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split('://', 1)[0],
+            'iterations': args.iterations,
+            'orders': args.orders if (args.seed or not args.database_url) else None,
+            'page_cache': app.config['PAGE_CACHE_ENABLED'],
+            'python': platform.python_version(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    for name, r in results.items():
+        print(f'{name:14} {r["throughput_rps"]:>8.1f} rps  p50 {r["p50_ms"]:>7.2f}  '
+              f'p95 {r["p95_ms"]:>7.2f}  p99 {r["p99_ms"]:>7.2f} ms')
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'Saved {args.save}')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'Regressions over {args.threshold:g}%: {", ".join(regressions)}')
+            sys.exit(1)
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from telegram_client import TelegramClient
+from tests.fake_telegram import FakeTelegram
+
+
+def run(orders, chat_limit, chat_rate):
+    server = FakeTelegram(chat_limit).start()
+    client = TelegramClient('TEST', api_url=server.url, chat_rate=chat_rate, chat_burst=chat_limit)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        documents = []
+        for name in ('step1.png', 'step3.pdf'):
+            path = os.path.join(tmp, name)
+            with open(path, 'wb') as f:
+                f.write(os.urandom(256 * 1024))
+            documents.append((name, path))
+
+        failed = 0
+        started = time.perf_counter()
+        for i in range(orders):
+            if client.send_message('1', f'Order #{i}').status_code != 200:
+                failed += 1
+            if client.send_documents('1', documents, caption=f'Order #{i}').status_code != 200:
+                failed += 1
+        elapsed = time.perf_counter() - started
+
+    server.shutdown()
+    print(f'orders: {orders}, elapsed: {elapsed:.2f}s, {orders / elapsed:.2f} orders/s')
+    print(f'api calls: {server.calls}')
+    print(f'tcp connections: {len(server.connections)}, 429 responses: {server.throttled}, failed: {failed}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure Telegram notifier throughput against a local fake API')
+    parser.add_argument('--orders', type=int, default=20)
+    parser.add_argument('--chat-limit', type=int, default=3, help='Messages per second the fake API accepts per chat')
+    parser.add_argument('--chat-rate', type=float, default=1, help='Client-side per-chat rate limit')
+    args = parser.parse_args()
+    run(args.orders, args.chat_limit, args.chat_rate)
@@ -0,0 +1,180 @@
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+import subprocess
+import tempfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# Copied as-is; everything else in the bundle is generated
+PLAIN_ASSETS = ('css/custom.css', 'js/main.js')
+
+ICON_SOURCES = ('templates/**/*.html', 'static/js/**/*.js')
+ICON_FONTS = (
+    ('fa-solid-900', '"Font Awesome 6 Free"', 900),
+    ('fa-brands-400', '"Font Awesome 6 Brands"', 400),
+)
+_ICON_RE = re.compile(r'\bfa-([a-z0-9-]+)')
+_SEED_ICON_RE = re.compile(r"'icon':\s*'([a-z0-9-]+)'")
+_FA_RULE_RE = re.compile(r'([^{}]+)\{\s*content:\s*"\\([0-9a-f]+)"\s*;?\s*\}')
+
+
+def build_tailwind(tailwind_bin, out_path):
+    subprocess.run([
+        tailwind_bin,
+        '-c', os.path.join(BASE_DIR, 'tailwind.config.js'),
+        '-i', os.path.join(BASE_DIR, 'assets', 'tailwind.css'),
+        '-o', out_path,
+        '--minify',
+    ], check=True, cwd=BASE_DIR)
+
+
+def used_icons(extra):
+    names = set(extra)
+    for pattern in ICON_SOURCES:
+        for path in glob.glob(os.path.join(BASE_DIR, pattern), recursive=True):
+            with open(path, 'r', encoding='utf-8') as f:
+                names.update(_ICON_RE.findall(f.read()))
+    with open(os.path.join(BASE_DIR, 'seed.py'), 'r', encoding='utf-8') as f:
+        names.update(_SEED_ICON_RE.findall(f.read()))
+    return names
+
+
+def icon_codepoints(fa_dir, names):
+    with open(os.path.join(fa_dir, 'css', 'all.css'), 'r', encoding='utf-8') as f:
+        css = f.read()
+    codepoints = {}
+    for selectors, code in _FA_RULE_RE.findall(css):
+        for selector in selectors.split(','):
+            selector = selector.strip()
+            if selector.startswith('.fa-') and selector.endswith('::before'):
+                name = selector[len('.fa-'):-len('::before')]
+                if name in names:
+                    codepoints[name] = code
+    return codepoints
+
+
+def build_icon_fonts(fa_dir, codepoints, out_dir):
+    from fontTools import subset
+
+    unicodes = sorted({int(code, 16) for code in codepoints.values()})
+    fonts = {}
+    for font_name, _, _ in ICON_FONTS:
+        src = os.path.join(fa_dir, 'webfonts', f'{font_name}.woff2')
+        dst = os.path.join(out_dir, f'{font_name}.woff2')
+        options = subset.Options()
+        options.flavor = 'woff2'
+        options.layout_features = ['*']
+        font = subset.load_font(src, options)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=unicodes)
+        subsetter.subset(font)
+        subset.save_font(font, dst, options)
+        fonts[font_name] = dst
+    return fonts
+
+
+def icons_css(codepoints, font_urls):
+    rules = []
+    for font_name, family, weight in ICON_FONTS:
+        rules.append(
+            f'@font-face{{font-family:{family};font-style:normal;font-weight:{weight};'
+            f'font-display:block;src:url({font_urls[font_name]}) format("woff2")}}'
+        )
+    rules.append(
+        '.fa,.fas,.fa-solid,.fab,.fa-brands{-moz-osx-font-smoothing:grayscale;'
+        '-webkit-font-smoothing:antialiased;display:var(--fa-display,inline-block);'
+        'font-style:normal;font-variant:normal;line-height:1;text-rendering:auto}'
+    )
+    rules.append('.fa,.fas,.fa-solid{font-family:"Font Awesome 6 Free";font-weight:900}')
+    rules.append('.fab,.fa-brands{font-family:"Font Awesome 6 Brands";font-weight:400}')
+    for name, code in sorted(codepoints.items()):
+        rules.append(f'.fa-{name}::before{{content:"\\{code}"}}')
+    return '\n'.join(rules) + '\n'
+
+
+def fingerprint(src, logical_name, manifest):
+    with open(src, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, ext = os.path.splitext(logical_name)
+    hashed = f'{stem}.{digest}{ext}'
+    dst = os.path.join(DIST_DIR, hashed)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    with open(dst, 'wb') as f:
+        f.write(data)
+    if ext != '.woff2':
+        with gzip.open(dst + '.gz', 'wb', compresslevel=9) as f:
+            f.write(data)
+        if brotli is not None:
+            with open(dst + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+    manifest[logical_name] = hashed
+    return hashed
+
+
+def build(tailwind_bin, fa_dir, extra_icons):
+    manifest = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if os.path.isdir(DIST_DIR):
+            shutil.rmtree(DIST_DIR)
+        os.makedirs(DIST_DIR)
+
+        app_css = os.path.join(tmp, 'app.css')
+        build_tailwind(tailwind_bin, app_css)
+        fingerprint(app_css, 'css/app.css', manifest)
+
+        codepoints = icon_codepoints(fa_dir, used_icons(extra_icons))
+        fonts = build_icon_fonts(fa_dir, codepoints, tmp)
+        font_urls = {}
+        for font_name, path in fonts.items():
+            hashed = fingerprint(path, f'webfonts/{font_name}.woff2', manifest)
+            font_urls[font_name] = '../' + hashed
+        icons_path = os.path.join(tmp, 'icons.css')
+        with open(icons_path, 'w', encoding='utf-8') as f:
+            f.write(icons_css(codepoints, font_urls))
+        fingerprint(icons_path, 'css/icons.css', manifest)
+
+        for name in PLAIN_ASSETS:
+            fingerprint(os.path.join(STATIC_DIR, name), name, manifest)
+
+    with open(os.path.join(DIST_DIR, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    for name, hashed in sorted(manifest.items()):
+        print(f'{name} -> {hashed}')
+    print(f'{len(codepoints)} icons in the Font Awesome subset')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build the fingerprinted CSS/JS/icon bundle into static/dist. '
+                    'Needs the Tailwind CSS standalone CLI, the fontawesome-free package '
+                    'and fonttools[woff] (brotli is used for .br files when installed).'
+    )
+    parser.add_argument('--tailwind', default=os.getenv('TAILWIND_BIN', 'tailwindcss'),
+                        help='Tailwind CSS CLI executable')
+    parser.add_argument('--fontawesome',
+                        default=os.getenv('FONTAWESOME_DIR',
+                                          os.path.join(BASE_DIR, 'node_modules', '@fortawesome', 'fontawesome-free')),
+                        help='Unpacked fontawesome-free 6.x package (css/all.css and webfonts/)')
+    parser.add_argument('--icons', nargs='*', default=[],
+                        help='Extra icon names, e.g. ones typed into a category in the admin panel')
+    args = parser.parse_args()
+    try:
+        build(args.tailwind, args.fontawesome, args.icons)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f'Asset build FAILED: {e}')
+        sys.exit(1)
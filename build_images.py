@@ -0,0 +1,33 @@
+import os
+import sys
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from images import generate_derivatives, DERIVED_RE, RASTER_EXTENSIONS
+
+
+def build_images(force=False):
+    upload_folder = app.config['UPLOAD_FOLDER']
+    built = skipped = 0
+    with app.app_context():
+        for root, dirs, files in os.walk(upload_folder):
+            dirs.sort()
+            for name in sorted(files):
+                if DERIVED_RE.search(name):
+                    continue
+                if name.rsplit('.', 1)[-1].lower() not in RASTER_EXTENSIONS:
+                    continue
+                if generate_derivatives(upload_folder, name, force=force):
+                    built += 1
+                    print(f'OK   {name}')
+                else:
+                    skipped += 1
+                    print(f'SKIP {name}')
+    print(f'Done: {built} images processed, {skipped} skipped')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build resized WebP/JPEG variants for files in static/uploads')
+    parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+    args = parser.parse_args()
+    build_images(force=args.force)
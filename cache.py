@@ -0,0 +1,57 @@
+import os
+import threading
+import uuid
+from flask import current_app, g
+
+
+def _stamp_path(name):
+    return os.path.join(current_app.config['CACHE_STAMP_FOLDER'], f'{name}.version')
+
+
+def get_version(name):
+    versions = g.setdefault('_cache_versions', {})
+    if name in versions:
+        return versions[name]
+    try:
+        with open(_stamp_path(name), 'r', encoding='ascii') as f:
+            version = f.read().strip()
+    except OSError:
+        version = ''
+    versions[name] = version
+    return version
+
+
+def bump_version(name):
+    path = _stamp_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w', encoding='ascii') as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+    g.pop('_cache_versions', None)
+
+
+# Process-local value; the version stamp file is shared by all workers on the host.
+class VersionedCache:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+
+    def get(self):
+        version = get_version(self.name)
+        if self._version == version and self._value is not None:
+            return self._value
+        with self._lock:
+            if self._version != version or self._value is None:
+                self._value = self.loader()
+                self._version = version
+        return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._version = None
+        bump_version(self.name)
@@ -0,0 +1,63 @@
+from collections import namedtuple
+
+from cache import VersionedCache
+from models import Category, Product
+
+
+CategoryNode = namedtuple('CategoryNode', [
+    'id', 'name', 'slug', 'description', 'image', 'icon', 'sort_order', 'is_active', 'products',
+])
+ProductNode = namedtuple('ProductNode', [
+    'id', 'category_id', 'name', 'description', 'image', 'sort_order', 'category',
+])
+CatalogTree = namedtuple('CatalogTree', ['categories', 'products', 'by_slug'])
+
+
+def _build_tree():
+    categories = {}
+    for c in Category.query.order_by(Category.sort_order, Category.id).all():
+        categories[c.id] = CategoryNode(
+            id=c.id,
+            name=c.name,
+            slug=c.slug,
+            description=c.description,
+            image=c.image,
+            icon=c.icon,
+            sort_order=c.sort_order,
+            is_active=bool(c.is_active),
+            products=[],
+        )
+
+    products = []
+    for p in Product.query.filter_by(is_active=True).order_by(Product.sort_order, Product.id).all():
+        category = categories.get(p.category_id)
+        node = ProductNode(
+            id=p.id,
+            category_id=p.category_id,
+            name=p.name,
+            description=p.description,
+            image=p.image,
+            sort_order=p.sort_order,
+            category=category,
+        )
+        products.append(node)
+        if category is not None:
+            category.products.append(node)
+
+    active = tuple(c for c in categories.values() if c.is_active)
+    return CatalogTree(
+        categories=active,
+        products=tuple(products),
+        by_slug={c.slug: c for c in active},
+    )
+
+
+_catalog_cache = VersionedCache('catalog', _build_tree)
+
+
+def get_catalog():
+    return _catalog_cache.get()
+
+
+def invalidate_catalog():
+    _catalog_cache.invalidate()
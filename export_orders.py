@@ -0,0 +1,44 @@
+import os
+import sys
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from order_export import EXPORT_FORMATS, export_filename, iter_csv, iter_xlsx, parse_date
+
+
+def _date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f'expected YYYY-MM-DD, got {value!r}')
+    return parsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export orders as CSV or XLSX, streamed from the database')
+    parser.add_argument('--from', dest='date_from', type=_date, help='First day, YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', type=_date, help='Last day (inclusive), YYYY-MM-DD')
+    parser.add_argument('--status', choices=('new', 'in_progress', 'done', 'cancelled'))
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('-o', '--output',
+                        help='File to write; "-" for stdout (CSV only). Default: orders_<range>.<format>')
+    args = parser.parse_args()
+
+    output = args.output or export_filename(args.format, args.date_from, args.date_to, args.status)
+    if output == '-' and args.format != 'csv':
+        parser.error('only CSV can be written to stdout')
+
+    with app.app_context():
+        if args.format == 'xlsx':
+            chunks = iter_xlsx(args.date_from, args.date_to, args.status)
+        else:
+            chunks = (c.encode('utf-8') for c in iter_csv(args.date_from, args.date_to, args.status))
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            with open(output, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            print(f'Exported orders to {output}', file=sys.stderr)
@@ -79,3 +79,8 @@ class SettingsForm(FlaskForm):
     company_name = StringField('Название компании')
     city = StringField('Город')
     logo = FileField('Логотип сайта', validators=[Optional(), FileAllowed(['svg', 'png', 'jpg', 'jpeg'], 'Только изображения')])
+
+
+class PriceImportForm(FlaskForm):
+    file = FileField('Файл с ценами', validators=[Optional(), FileAllowed(['csv', 'json'], 'Только CSV или JSON')])
+    rows = HiddenField()
@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from upload_gc import DEFAULT_BATCH_SIZE, collect_garbage
+
+
+def _size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+
+
+if __name__ == '__main__':
+    # Step 1 of the order wizard saves the file before the order exists and
+    # each later step refreshes the wizard state, so by default wait two
+    # wizard lifetimes before treating such a file as abandoned.
+    default_grace = 2 * app.config['WIZARD_STATE_TTL'] / 3600
+    parser = argparse.ArgumentParser(
+        description='Delete uploaded files that no category, product, layout, price option, '
+                    'order or the site logo refers to'
+    )
+    parser.add_argument('--apply', action='store_true', help='Delete the files; default is a dry run')
+    parser.add_argument('--grace-hours', type=float, default=default_grace,
+                        help=f'Keep files modified within this many hours (default {default_grace:g})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Files deleted per batch')
+    parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+    parser.add_argument('-v', '--verbose', action='store_true', help='List every orphaned file')
+    args = parser.parse_args()
+
+    def show(orphan):
+        print(f'{datetime.fromtimestamp(orphan.mtime):%Y-%m-%d %H:%M}  {orphan.size:>10}  {orphan.path}')
+
+    started = time.monotonic()
+    with app.app_context():
+        report = collect_garbage(args.grace_hours * 3600, apply=args.apply, batch_size=args.batch_size,
+                                 pause=args.pause, on_orphan=show if args.verbose else None)
+    if args.apply:
+        print(f'Deleted {report.files} files, reclaimed {_size(report.bytes)} '
+              f'in {time.monotonic() - started:.1f}s')
+        if report.skipped:
+            print(f'Kept {report.skipped} files that were used again while the GC ran')
+    else:
+        print(f'Dry run: {report.files} orphaned files, {_size(report.bytes)} would be reclaimed; '
+              f're-run with --apply to delete them')
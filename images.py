@@ -0,0 +1,97 @@
+import json
+import os
+import re
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps
+
+from uploads import stem, stored_path, upload_subdir, upload_url
+
+
+DERIVATIVE_WIDTHS = (160, 320, 640, 960)
+RASTER_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
+# Variants sit next to their original in its fan-out directory: <stem>-<width>.<fmt>
+DERIVED_RE = re.compile(r'-(%s)\.(webp|jpg)$' % '|'.join(str(w) for w in DERIVATIVE_WIDTHS))
+
+_manifests = {}
+
+
+def derived_name(filename, width, fmt):
+    return f'{upload_subdir(filename)}/{stem(filename)}-{width}.{fmt}'
+
+
+def _manifest_path(upload_folder, filename):
+    return os.path.join(upload_folder, *upload_subdir(filename).split('/'), f'{stem(filename)}.json')
+
+
+def generate_derivatives(upload_folder, filename, force=False):
+    if not filename or filename.rsplit('.', 1)[-1].lower() not in RASTER_EXTENSIONS:
+        return None
+    manifest_path = _manifest_path(upload_folder, filename)
+    if not force and os.path.exists(manifest_path):
+        return manifest_path
+    source = stored_path(upload_folder, filename)
+    try:
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA')
+            width, height = img.size
+            widths = [w for w in DERIVATIVE_WIDTHS if w < width] or [width]
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+            for w in widths:
+                h = max(1, round(height * w / width))
+                resized = img.resize((w, h), Image.LANCZOS) if w != width else img
+                resized.save(os.path.join(upload_folder, derived_name(filename, w, 'webp')),
+                             'WEBP', quality=80, method=6)
+                flat = resized
+                if resized.mode == 'RGBA':
+                    flat = Image.new('RGB', resized.size, (255, 255, 255))
+                    flat.paste(resized, mask=resized.split()[3])
+                flat.save(os.path.join(upload_folder, derived_name(filename, w, 'jpg')),
+                          'JPEG', quality=82, optimize=True, progressive=True)
+    except (OSError, ValueError) as e:
+        current_app.logger.warning(f'Could not build image derivatives for {filename}: {e}')
+        return None
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'width': width, 'height': height, 'widths': widths}, f)
+    _manifests.pop(filename, None)
+    return manifest_path
+
+
+def _manifest(filename):
+    manifest = _manifests.get(filename)
+    if manifest is None:
+        path = _manifest_path(current_app.config['UPLOAD_FOLDER'], filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _manifests[filename] = manifest
+    return manifest
+
+
+def responsive_img(filename, alt='', class_='', sizes='(max-width: 640px) 50vw, 320px', loading='lazy'):
+    original = upload_url(filename)
+    manifest = _manifest(filename)
+    if manifest is None:
+        return Markup(f'<img src="{original}" alt="{escape(alt)}" class="{escape(class_)}" loading="{loading}">')
+
+    def srcset(fmt):
+        return ', '.join(
+            f"{url_for('upload', filename=derived_name(filename, w, fmt))} {w}w"
+            for w in manifest['widths']
+        )
+
+    largest = manifest['widths'][-1]
+    return Markup(
+        '<picture class="contents">'
+        f'<source type="image/webp" srcset="{srcset("webp")}" sizes="{sizes}">'
+        f'<img src="{url_for("upload", filename=derived_name(filename, largest, "jpg"))}" '
+        f'srcset="{srcset("jpg")}" sizes="{sizes}" '
+        f'width="{manifest["width"]}" height="{manifest["height"]}" '
+        f'alt="{escape(alt)}" class="{escape(class_)}" loading="{loading}" decoding="async">'
+        '</picture>'
+    )
@@ -0,0 +1,95 @@
+import time
+from contextlib import contextmanager
+from flask import (current_app, g, has_app_context, has_request_context, request,
+                   before_render_template, request_started, template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+OUTBOUND_KINDS = ('http', 'smtp')
+
+
+def _new_timings():
+    return {'start': time.perf_counter(), 'queries': 0, 'db': 0.0, 'render': 0.0,
+            'http': 0.0, 'smtp': 0.0}
+
+
+def request_timings():
+    if not has_request_context():
+        return None
+    timings = g.get('_timings')
+    if timings is None:
+        timings = g._timings = _new_timings()
+    return timings
+
+
+@request_started.connect
+def _start_request(sender, **extra):
+    g._timings = _new_timings()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['_query_started'].pop()
+    timings = request_timings()
+    if timings is not None:
+        timings['queries'] += 1
+        timings['db'] += elapsed
+    if has_app_context():
+        threshold = current_app.config['SLOW_QUERY_MS']
+        if threshold and elapsed * 1000 >= threshold:
+            view = request.endpoint if has_request_context() else '-'
+            current_app.logger.warning(
+                f'Slow query ({elapsed * 1000:.0f} ms) in {view}: {" ".join(statement.split())[:2000]}'
+            )
+
+
+@event.listens_for(Engine, 'handle_error')
+def _failed_query(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('_query_started'):
+        conn.info['_query_started'].pop()
+
+
+@before_render_template.connect
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('_render_started', []).append(time.perf_counter())
+
+
+@template_rendered.connect
+def _after_render(sender, template, context, **extra):
+    timings = request_timings()
+    if timings is not None and g.get('_render_started'):
+        timings['render'] += time.perf_counter() - g._render_started.pop()
+
+
+@contextmanager
+def outbound(kind):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = request_timings()
+        if timings is not None:
+            timings[kind] += time.perf_counter() - started
+
+
+def server_timing_header():
+    timings = request_timings()
+    if timings is None:
+        return ''
+    parts = [
+        f'db;dur={timings["db"] * 1000:.1f};desc="{timings["queries"]} queries"',
+        f'render;dur={timings["render"] * 1000:.1f}',
+    ]
+    for kind in OUTBOUND_KINDS:
+        if timings[kind]:
+            parts.append(f'{kind};dur={timings[kind] * 1000:.1f}')
+    parts.append(f'total;dur={(time.perf_counter() - timings["start"]) * 1000:.1f}')
+    return ', '.join(parts)
@@ -1,14 +1,12 @@
 import os
-import smtplib
-import ssl
 import json
 import html as _html_mod
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+from urllib.parse import urlsplit
 from flask import current_app
 
+from mail_transport import OutgoingMessage, get_transport
+from uploads import attachment_path
+
 
 def _h(s):
     return _html_mod.escape(str(s)) if s else '—'
@@ -29,11 +27,6 @@ def send_order_email(order):
         current_app.logger.error('MAIL_PASSWORD is empty -- cannot send email')
         return False
 
-    msg = MIMEMultipart('mixed')
-    msg['Subject'] = f'Новый заказ #{order.id} — Печати7'
-    msg['From'] = sender
-    msg['To'] = recipient
-
     html = f"""
     <html>
     <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
@@ -103,6 +96,32 @@ def send_order_email(order):
             """
         except (json.JSONDecodeError, TypeError):
             pass
+
+    attachments = []
+    links = []
+    for file_field in [order.file_path, getattr(order, 'file_path_step3', '') or '']:
+        if file_field:
+            file_path = attachment_path(config, file_field)
+            if not os.path.isfile(file_path):
+                continue
+            if os.path.getsize(file_path) <= config['MAIL_ATTACHMENT_MAX_BYTES']:
+                attachments.append((file_field, file_path))
+            elif config['SITE_URL']:
+                links.append((file_field, _download_url(file_field)))
+            else:
+                current_app.logger.warning(
+                    f'File {file_field} of order #{order.id} exceeds MAIL_ATTACHMENT_MAX_BYTES '
+                    f'but SITE_URL is not set -- attaching it in full'
+                )
+                attachments.append((file_field, file_path))
+    if links:
+        links_html = '<br>'.join(f'<a href="{_h(url)}">{_h(name)}</a>' for name, url in links)
+        html += f"""
+                <tr>
+                    <td style="padding: 8px; font-weight: bold; border-bottom: 1px solid #e5e7eb;">Файлы:</td>
+                    <td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">{links_html}</td>
+                </tr>
+            """
     html += """
             </table>
         </div>
@@ -113,38 +132,22 @@ def send_order_email(order):
     </html>
     """
 
-    body = MIMEMultipart('alternative')
-    body.attach(MIMEText(html, 'html'))
-    msg.attach(body)
-
-    upload_folder = config.get('UPLOAD_FOLDER', '')
-    for file_field in [order.file_path, getattr(order, 'file_path_step3', '') or '']:
-        if file_field:
-            file_path = os.path.join(upload_folder, file_field) if upload_folder else file_field
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, 'rb') as fp:
-                        part = MIMEBase('application', 'octet-stream')
-                        part.set_payload(fp.read())
-                    encoders.encode_base64(part)
-                    part.add_header('Content-Disposition', 'attachment', filename=file_field)
-                    msg.attach(part)
-                except Exception as e:
-                    current_app.logger.warning(f'Could not attach file {file_field}: {e}')
+    msg = OutgoingMessage(sender, recipient, f'Новый заказ #{order.id} — Печати7', html)
+    for file_field, file_path in attachments:
+        msg.attach_file(file_field, file_path)
 
     try:
-        context = ssl.create_default_context()
-        if config['MAIL_USE_SSL']:
-            with smtplib.SMTP_SSL(server_addr, port, context=context, timeout=15) as server:
-                server.login(sender, password)
-                server.sendmail(sender, recipient, msg.as_string())
-        else:
-            with smtplib.SMTP(server_addr, port, timeout=15) as server:
-                server.starttls(context=context)
-                server.login(sender, password)
-                server.sendmail(sender, recipient, msg.as_string())
+        get_transport(config).send(msg)
         current_app.logger.info(f'Email sent successfully for order #{order.id}')
         return True
     except Exception as e:
         current_app.logger.error(f'Email send FAILED for order #{order.id}: {type(e).__name__}: {e}')
         return False
+
+
+def _download_url(filename):
+    # The worker has no request to take the host from, so links point at SITE_URL
+    site = urlsplit(current_app.config['SITE_URL'])
+    adapter = current_app.url_map.bind(site.netloc, script_name=site.path or '/',
+                                       url_scheme=site.scheme or 'https')
+    return adapter.build('admin_upload', {'filename': filename}, force_external=True)
@@ -0,0 +1,181 @@
+import base64
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from tempfile import SpooledTemporaryFile
+
+from instrumentation import outbound
+
+
+# 57 raw bytes encode to exactly one 76-character base64 line
+_LINE_BYTES = 57
+_CHUNK_BYTES = _LINE_BYTES * 1024
+_SPOOL_BYTES = 1024 * 1024
+
+
+def _b64_lines(data):
+    encoded = base64.b64encode(data)
+    return b''.join(encoded[i:i + 76] + b'\r\n' for i in range(0, len(encoded), 76))
+
+
+class OutgoingMessage:
+    def __init__(self, sender, recipient, subject, html):
+        self.sender = sender
+        self.recipient = recipient
+        self.subject = subject
+        self.html = html
+        self.attachments = []
+
+    def attach_file(self, filename, path):
+        self.attachments.append((filename, path))
+
+    def write_to(self, fp):
+        # Every body part is base64, so no line can start with '.' and the
+        # result can go to the DATA command without dot-stuffing.
+        boundary = f'=={uuid.uuid4().hex}=='
+        headers = [
+            f'From: {self.sender}',
+            f'To: {self.recipient}',
+            f'Subject: {Header(self.subject, "utf-8").encode()}',
+            f'Date: {formatdate(localtime=True)}',
+            f'Message-ID: {make_msgid()}',
+            'MIME-Version: 1.0',
+            f'Content-Type: multipart/mixed; boundary="{boundary}"',
+        ]
+        fp.write(('\r\n'.join(headers) + '\r\n\r\n').encode('ascii'))
+
+        fp.write((f'--{boundary}\r\n'
+                  'Content-Type: text/html; charset="utf-8"\r\n'
+                  'Content-Transfer-Encoding: base64\r\n\r\n').encode('ascii'))
+        fp.write(_b64_lines(self.html.encode('utf-8')))
+
+        for filename, path in self.attachments:
+            with open(path, 'rb') as src:
+                fp.write((f'--{boundary}\r\n'
+                          'Content-Type: application/octet-stream\r\n'
+                          f'Content-Disposition: attachment; filename="{filename}"\r\n'
+                          'Content-Transfer-Encoding: base64\r\n\r\n').encode('ascii'))
+                while True:
+                    chunk = src.read(_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    fp.write(_b64_lines(chunk))
+
+        fp.write(f'--{boundary}--\r\n'.encode('ascii'))
+
+
+class SMTPTransport:
+    def __init__(self, host, port, use_ssl, use_tls, username, password,
+                 timeout=15, keepalive=60):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        context = ssl.create_default_context()
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, context=context, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                server.starttls(context=context)
+        server.ehlo_or_helo_if_needed()
+        if self.password and server.has_extn('auth'):
+            server.login(self.username, self.password)
+        return server
+
+    def _is_alive(self):
+        if self._server is None:
+            return False
+        if time.monotonic() - self._last_used < self.keepalive:
+            return True
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                self._server.close()
+            self._server = None
+
+    def _drop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def _send_data(self, sender, recipients, fp):
+        server = self._server
+        code, resp = server.mail(sender)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, resp, sender)
+        for rcpt in recipients:
+            code, resp = server.rcpt(rcpt)
+            if code not in (250, 251):
+                raise smtplib.SMTPRecipientsRefused({rcpt: (code, resp)})
+        code, resp = server.docmd('data')
+        if code != 354:
+            raise smtplib.SMTPDataError(code, resp)
+        fp.seek(0)
+        while True:
+            chunk = fp.read(64 * 1024)
+            if not chunk:
+                break
+            server.send(chunk)
+        server.send(b'.\r\n')
+        code, resp = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, resp)
+
+    def send(self, message):
+        with SpooledTemporaryFile(max_size=_SPOOL_BYTES) as fp:
+            message.write_to(fp)
+            with self._lock, outbound('smtp'):
+                for attempt in range(2):
+                    if not self._is_alive():
+                        self.close()
+                        self._server = self._connect()
+                    try:
+                        self._send_data(message.sender, [message.recipient], fp)
+                        self._last_used = time.monotonic()
+                        return
+                    except (smtplib.SMTPServerDisconnected, OSError):
+                        self._drop()
+                        if attempt:
+                            raise
+                    except smtplib.SMTPException:
+                        try:
+                            self._server.rset()
+                        except (smtplib.SMTPException, OSError):
+                            self._drop()
+                        raise
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(config):
+    key = (config['MAIL_SERVER'], config['MAIL_PORT'], config['MAIL_USE_SSL'],
+           config['MAIL_USE_TLS'], config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = SMTPTransport(*key, keepalive=config['MAIL_KEEPALIVE'])
+            _transports[key] = transport
+        return transport
@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+import argparse
+from flask import url_for
+from sqlalchemy import event
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db, Admin, Layout, Order, PriceOption, Product
+from migrations import MIGRATIONS, applied_versions, upgrade_schema
+from warm_pages import page_paths
+
+_FULL_SCAN_RE = re.compile(r'Seq Scan on (\w+)|\bSCAN (\w+)\b(?! USING| VIRTUAL)')
+
+
+def view_paths():
+    paths = page_paths()
+    with app.test_request_context():
+        paths += [url_for('sitemap_xml'), url_for('sitemap_xml_gz')]
+        product = Product.query.filter_by(is_active=True).order_by(Product.id).first()
+        if product:
+            paths += [url_for('order_product', product_id=product.id, step=step) for step in (1, 2, 3)]
+            paths += [url_for('api_quote', product_id=product.id),
+                      url_for('api_quote', product_id=product.id, qty=2, delivery=1)]
+        paths += [url_for('order'), url_for('order_success')]
+        paths += [url_for('admin_dashboard'), url_for('admin_orders'),
+                  url_for('admin_orders', status='new'), url_for('admin_orders', q='ООО'),
+                  url_for('admin_products'), url_for('admin_product_add'),
+                  url_for('admin_categories'), url_for('admin_category_add'),
+                  url_for('admin_settings'), url_for('admin_price_import')]
+        if product:
+            paths += [url_for('admin_product_edit', id=product.id),
+                      url_for('admin_category_edit', id=product.category_id),
+                      url_for('admin_price_add', product_id=product.id),
+                      url_for('admin_layout_add', product_id=product.id)]
+            price_option = PriceOption.query.filter_by(product_id=product.id).first()
+            if price_option:
+                paths.append(url_for('admin_price_edit', id=price_option.id))
+            layout = Layout.query.filter_by(product_id=product.id).first()
+            if layout:
+                paths.append(url_for('admin_layout_edit', id=layout.id))
+        order = Order.query.order_by(Order.id.desc()).first()
+        if order:
+            paths.append(url_for('admin_order_detail', id=order.id))
+    return paths
+
+
+def admin_client():
+    # Requests must not share an app context with the caller, or the
+    # session identity map would hide queries a real request makes.
+    app.config['PAGE_CACHE_ENABLED'] = False
+    client = app.test_client()
+    with app.app_context():
+        admin = Admin.query.first()
+        if admin:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(admin.id)
+                sess['_fresh'] = True
+    return client
+
+
+def capture_queries(paths):
+    captured = {}
+    current = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current and statement.lstrip().upper().startswith('SELECT'):
+            captured[current[0]].append((statement, parameters))
+
+    client = admin_client()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for path in paths:
+            current[:] = [path]
+            captured[path] = []
+            resp = client.get(path)
+            if resp.status_code != 200:
+                print(f'{resp.status_code} {path}')
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def explain(no_seqscan=False):
+    captured = capture_queries(view_paths())
+    with app.app_context():
+        engine = db.engine
+    dialect = engine.dialect.name
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+    full_scans = {}
+    with engine.connect() as conn:
+        if no_seqscan and dialect == 'postgresql':
+            conn.exec_driver_sql('SET enable_seqscan = off')
+        for path, statements in captured.items():
+            print(f'=== {path} ({len(statements)} queries)')
+            seen = set()
+            for statement, parameters in statements:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                print('--', ' '.join(statement.split())[:200])
+                for row in conn.exec_driver_sql(prefix + statement, parameters):
+                    if dialect == 'postgresql':
+                        line = row[0]
+                        tables = [m.group(1) for m in _FULL_SCAN_RE.finditer(line) if m.group(1)]
+                    elif dialect == 'sqlite':
+                        line = row[-1]
+                        tables = [m.group(2) for m in _FULL_SCAN_RE.finditer(line) if m.group(2)]
+                    else:
+                        plan = row._mapping
+                        line = ' '.join(f'{k}={v}' for k, v in plan.items() if v is not None)
+                        tables = [plan['table']] if plan.get('type') == 'ALL' else []
+                    print('   ', line)
+                    for table in tables:
+                        full_scans.setdefault(table, set()).add(path)
+    print('=== Full table scans')
+    if not full_scans:
+        print('none')
+    for table, paths in sorted(full_scans.items()):
+        print(f'{table}: {", ".join(sorted(paths))}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply schema migrations or inspect query plans')
+    parser.add_argument('command', nargs='?', default='upgrade', choices=('upgrade', 'status', 'explain'))
+    parser.add_argument('--no-seqscan', action='store_true',
+                        help='explain: disable sequential scans on Postgres, so plans on a small '
+                             'database show which index the query would use')
+    args = parser.parse_args()
+    if args.command == 'explain':
+        explain(no_seqscan=args.no_seqscan)
+        sys.exit(0)
+    with app.app_context():
+        if args.command == 'upgrade':
+            upgrade_schema()
+        applied = applied_versions()
+        for version, name, _ in MIGRATIONS:
+            print(f'{"applied" if version in applied else "pending"}  {version:04d} {name}')
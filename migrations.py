@@ -0,0 +1,203 @@
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import inspect, select, text
+from sqlalchemy.schema import CreateIndex
+
+from models import db, Category, Order, Product, Layout, PriceOption, SchemaMigration, SiteSetting, WizardState
+from images import DERIVED_RE
+from uploads import upload_path, upload_subdir
+
+
+MIGRATIONS = []
+
+# Arbitrary key for pg_advisory_lock / GET_LOCK so that only one process
+# (gunicorn worker, release step, CLI) applies migrations at a time.
+_LOCK_KEY = 7305190214
+_LOCK_TIMEOUT = '5s'
+
+
+def migration(version, name):
+    def decorator(f):
+        MIGRATIONS.append((version, name, f))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return f
+    return decorator
+
+
+def _index(table, name):
+    return next(i for i in table.indexes if i.name == name)
+
+
+def create_index_online(index):
+    engine = db.engine
+    dialect = engine.dialect.name
+    table = index.table.name
+    if dialect == 'postgresql':
+        # CONCURRENTLY takes no write lock on the table but cannot run inside
+        # a transaction; a failed build leaves an INVALID index behind that
+        # IF NOT EXISTS would skip, so drop it first.
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(f"SET lock_timeout = '{_LOCK_TIMEOUT}'"))
+            valid = conn.execute(text(
+                'SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                'WHERE c.relname = :name'
+            ), {'name': index.name}).scalar()
+            if valid is False:
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}'))
+            ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+            conn.execute(text(ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)))
+        return
+    existing = {i['name'] for i in inspect(engine).get_indexes(table)}
+    if index.name in existing:
+        return
+    ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+    if dialect in ('mysql', 'mariadb'):
+        ddl += ' ALGORITHM=INPLACE LOCK=NONE'
+    with engine.begin() as conn:
+        conn.execute(text(ddl))
+
+
+@migration(1, 'baseline schema')
+def _baseline():
+    db.create_all()
+
+
+@migration(2, 'order search column and index')
+def _order_search():
+    from order_search import install_order_search
+    install_order_search()
+
+
+@migration(3, 'backfill order stats')
+def _order_stats():
+    from stats import rebuild_stats
+    rebuild_stats()
+
+
+@migration(4, 'hot path indexes')
+def _hot_path_indexes():
+    for table, name in (
+        (Order.__table__, 'ix_orders_created_at_id'),
+        (Order.__table__, 'ix_orders_status_created_at_id'),
+        (Order.__table__, 'ix_orders_product_id'),
+        (Product.__table__, 'ix_products_category_active_sort'),
+        (Layout.__table__, 'ix_layouts_product_sort'),
+        (PriceOption.__table__, 'ix_price_options_product_sort'),
+    ):
+        create_index_online(_index(table, name))
+
+
+@migration(5, 'catalog updated_at timestamps')
+def _catalog_updated_at():
+    engine = db.engine
+    for table in (Category.__table__, Product.__table__):
+        column = table.c.updated_at
+        if column.name in {c['name'] for c in inspect(engine).get_columns(table.name)}:
+            continue
+        with engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} '
+                              f'{column.type.compile(dialect=engine.dialect)}'))
+            conn.execute(table.update().where(column.is_(None)).values({column: datetime.utcnow()}))
+
+
+@migration(6, 'server-side wizard state')
+def _wizard_states():
+    WizardState.__table__.create(db.engine, checkfirst=True)
+
+
+@migration(7, 'shard upload directories')
+def _shard_uploads():
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    attachment_folder = current_app.config['ATTACHMENT_FOLDER']
+    attachments = set()
+    for a, b in db.session.execute(select(Order.file_path, Order.file_path_step3)):
+        attachments.update(n for n in (a, b) if n)
+    public = {SiteSetting.get('logo_path', '')}
+    for model in (Category, Product, Layout, PriceOption):
+        public.update(db.session.execute(select(model.image)).scalars())
+
+    def place(src, dst, copy=False):
+        if os.path.exists(dst):
+            if not copy:
+                os.remove(src)
+            return
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        (shutil.copy2 if copy else shutil.move)(src, dst)
+
+    if os.path.isdir(upload_folder):
+        for name in os.listdir(upload_folder):
+            src = os.path.join(upload_folder, name)
+            if not os.path.isfile(src) or name.startswith('.') or name.endswith('.part'):
+                continue
+            # Identical bytes share a digest name, so one file can be both
+            if name in attachments:
+                place(src, upload_path(attachment_folder, name), copy=name in public)
+            if name not in attachments or name in public:
+                place(src, upload_path(upload_folder, name))
+
+    derived = os.path.join(upload_folder, 'derived')
+    if os.path.isdir(derived):
+        for name in os.listdir(derived):
+            src = os.path.join(derived, name)
+            if not os.path.isfile(src):
+                continue
+            # <stem>-<width>.<fmt> and <stem>.json go to the shard of <stem>
+            shard = upload_subdir(DERIVED_RE.sub('.jpg', name))
+            place(src, os.path.join(upload_folder, *shard.split('/'), name))
+        if not os.listdir(derived):
+            os.rmdir(derived)
+
+
+@migration(8, 'order search indexes, retried')
+def _order_search_retry():
+    # Version 2 used to log index errors and still get recorded; rerunning
+    # the idempotent setup finishes whatever it left undone.
+    from order_search import install_order_search
+    install_order_search()
+
+
+@contextmanager
+def _migration_lock():
+    engine = db.engine
+    dialect = engine.dialect.name
+    if dialect not in ('postgresql', 'mysql', 'mariadb'):
+        yield
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if dialect == 'postgresql':
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': _LOCK_KEY})
+        else:
+            conn.execute(text('SELECT GET_LOCK(:key, 600)'), {'key': str(_LOCK_KEY)})
+        try:
+            yield
+        finally:
+            if dialect == 'postgresql':
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': _LOCK_KEY})
+            else:
+                conn.execute(text('SELECT RELEASE_LOCK(:key)'), {'key': str(_LOCK_KEY)})
+
+
+def applied_versions():
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    return set(db.session.execute(select(SchemaMigration.version)).scalars())
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def upgrade_schema():
+    with _migration_lock():
+        pending = pending_migrations()
+        # CREATE INDEX CONCURRENTLY waits for every open transaction,
+        # including an idle one held by this session.
+        db.session.commit()
+        for version, name, apply in pending:
+            current_app.logger.info(f'Applying migration {version}: {name}')
+            apply()
+            db.session.add(SchemaMigration(version=version, name=name, applied_at=datetime.utcnow()))
+            db.session.commit()
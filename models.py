@@ -1,8 +1,17 @@
+import json
+import re
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from cache import VersionedCache
+
 db = SQLAlchemy()
 
 
@@ -29,12 +38,16 @@ class Category(db.Model):
     icon = db.Column(db.String(100), default='')
     sort_order = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     products = db.relationship('Product', backref='category', lazy=True,
                                order_by='Product.sort_order')
 
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_category_active_sort', 'category_id', 'is_active', 'sort_order'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
     name = db.Column(db.String(200), nullable=False)
@@ -42,6 +55,8 @@ class Product(db.Model):
     image = db.Column(db.String(300), default='')
     sort_order = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
+    # Also bumped when the product's layouts or price options change
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     price_options = db.relationship('PriceOption', backref='product', lazy=True,
                                     cascade='all, delete-orphan',
                                     order_by='PriceOption.sort_order')
@@ -52,6 +67,9 @@ class Product(db.Model):
 
 class Layout(db.Model):
     __tablename__ = 'layouts'
+    __table_args__ = (
+        db.Index('ix_layouts_product_sort', 'product_id', 'sort_order'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     name = db.Column(db.String(200), nullable=False)
@@ -62,6 +80,9 @@ class Layout(db.Model):
 
 class PriceOption(db.Model):
     __tablename__ = 'price_options'
+    __table_args__ = (
+        db.Index('ix_price_options_product_sort', 'product_id', 'sort_order'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     osnastka_type = db.Column(db.String(100), nullable=False)
@@ -71,8 +92,21 @@ class PriceOption(db.Model):
     sort_order = db.Column(db.Integer, default=0)
 
 
+ORDER_STATUS_LABELS = {
+    'new': 'Новый',
+    'in_progress': 'В работе',
+    'done': 'Готов',
+    'cancelled': 'Отменён'
+}
+
+
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_orders_product_id', 'product_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=True)
     layout_id = db.Column(db.Integer, db.ForeignKey('layouts.id'), nullable=True)
@@ -87,11 +121,13 @@ class Order(db.Model):
     file_path = db.Column(db.String(300), default='')
     file_path_step3 = db.Column(db.String(300), default='')
     params_json = db.Column(db.Text, default='')
-    status = db.Column(db.String(50), default='new')
+    # active_history: the stats rollups need the previous status on change
+    status = db.column_property(db.Column(db.String(50), default='new'), active_history=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     needs_delivery = db.Column(db.Boolean, default=False)
     delivery_datetime = db.Column(db.String(200), default='')
     delivery_address = db.Column(db.Text, default='')
+    search_text = db.Column(db.Text, default='')
 
     product = db.relationship('Product', backref='orders', lazy=True)
     layout = db.relationship('Layout', backref='orders', lazy=True)
@@ -99,13 +135,7 @@ class Order(db.Model):
 
     @property
     def status_label(self):
-        labels = {
-            'new': 'Новый',
-            'in_progress': 'В работе',
-            'done': 'Готов',
-            'cancelled': 'Отменён'
-        }
-        return labels.get(self.status, self.status)
+        return ORDER_STATUS_LABELS.get(self.status, self.status)
 
     @property
     def status_color(self):
@@ -117,6 +147,115 @@ class Order(db.Model):
         }
         return colors.get(self.status, 'gray')
 
+    def build_search_text(self):
+        parts = [self.name, self.phone, normalize_phone(self.phone), self.email, self.message]
+        if self.params_json:
+            try:
+                params = json.loads(self.params_json)
+            except (ValueError, TypeError):
+                params = {}
+            if isinstance(params, dict):
+                parts.extend(str(v) for v in params.values() if v not in (None, ''))
+        return ' '.join(str(p) for p in parts if p).lower()
+
+
+def normalize_phone(value):
+    digits = re.sub(r'\D', '', value or '')
+    if len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    return digits
+
+
+@event.listens_for(Session, 'after_flush')
+def _touch_parent_products(session, flush_context):
+    product_ids = {obj.product_id for obj in (*session.new, *session.dirty, *session.deleted)
+                   if isinstance(obj, (Layout, PriceOption)) and obj.product_id}
+    if product_ids:
+        session.execute(Product.__table__.update()
+                        .where(Product.id.in_(product_ids))
+                        .values(updated_at=datetime.utcnow()))
+
+
+@event.listens_for(Order, 'before_insert')
+@event.listens_for(Order, 'before_update')
+def _refresh_order_search_text(mapper, connection, order):
+    order.search_text = order.build_search_text()
+
+
+ORDER_DETAIL_LOADERS = (
+    joinedload(Order.product),
+    joinedload(Order.layout),
+    joinedload(Order.price_option),
+)
+
+
+class OrderStatusCount(db.Model):
+    __tablename__ = 'order_status_counts'
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+
+class OrderDailyStat(db.Model):
+    __tablename__ = 'order_daily_stats'
+    day = db.Column(db.Date, primary_key=True)
+    scope = db.Column(db.String(20), primary_key=True)  # 'all', 'product' or 'category'
+    ref_id = db.Column(db.Integer, primary_key=True, default=0)
+    orders = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0, nullable=False)
+
+
+class WizardState(db.Model):
+    __tablename__ = 'wizard_states'
+    key = db.Column(db.String(128), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class OrderNotification(db.Model):
+    __tablename__ = 'order_notifications'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    channel = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    order = db.relationship('Order', backref=db.backref('notifications', lazy=True,
+                                                        order_by='OrderNotification.id',
+                                                        cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_order_notifications_due', 'status', 'next_attempt_at'),
+    )
+
+    @property
+    def channel_label(self):
+        labels = {
+            'email': 'Email',
+            'telegram': 'Telegram',
+            'telegram_files': 'Telegram (файлы)',
+        }
+        return labels.get(self.channel, self.channel)
+
+    @property
+    def status_label(self):
+        labels = {
+            'pending': 'В очереди',
+            'sent': 'Отправлено',
+            'failed': 'Ошибка',
+        }
+        return labels.get(self.status, self.status)
+
 
 class SiteSetting(db.Model):
     __tablename__ = 'site_settings'
@@ -126,15 +265,50 @@ class SiteSetting(db.Model):
 
     @staticmethod
     def get(key, default=''):
-        setting = SiteSetting.query.filter_by(key=key).first()
-        return setting.value if setting else default
+        return _settings_cache.get().get(key, default)
+
+    @staticmethod
+    def all_values():
+        return _settings_cache.get()
 
     @staticmethod
     def set(key, value):
-        setting = SiteSetting.query.filter_by(key=key).first()
-        if setting:
-            setting.value = value
+        SiteSetting.set_many({key: value})
+
+    @staticmethod
+    def set_many(values):
+        if not values:
+            return
+        rows = [{'key': k, 'value': v} for k, v in values.items()]
+        table = SiteSetting.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(index_elements=[table.c.key],
+                                              set_={'value': stmt.excluded.value})
+            db.session.execute(stmt)
+        elif dialect in ('mysql', 'mariadb'):
+            stmt = mysql_insert(table).values(rows)
+            stmt = stmt.on_duplicate_key_update(value=stmt.inserted.value)
+            db.session.execute(stmt)
         else:
-            setting = SiteSetting(key=key, value=value)
-            db.session.add(setting)
+            existing = {s.key: s for s in SiteSetting.query.filter(SiteSetting.key.in_(values)).all()}
+            for k, v in values.items():
+                if k in existing:
+                    existing[k].value = v
+                else:
+                    db.session.add(SiteSetting(key=k, value=v))
         db.session.commit()
+        _settings_cache.invalidate()
+
+    @staticmethod
+    def invalidate_cache():
+        _settings_cache.invalidate()
+
+
+def _load_settings():
+    return {key: value for key, value in db.session.query(SiteSetting.key, SiteSetting.value)}
+
+
+_settings_cache = VersionedCache('site_settings', _load_settings)
@@ -0,0 +1,123 @@
+import time
+from datetime import datetime, timedelta
+from flask import after_this_request, current_app
+
+from models import db, Order, OrderNotification, ORDER_DETAIL_LOADERS
+from mail import send_order_email
+from telegram import order_files, send_order_telegram, send_order_telegram_files
+
+
+CHANNELS = {
+    'email': send_order_email,
+    'telegram': send_order_telegram,
+    'telegram_files': send_order_telegram_files,
+}
+
+
+def enqueue_order_notifications(order):
+    for channel in CHANNELS:
+        if channel == 'telegram_files' and not order_files(order):
+            continue
+        order.notifications.append(OrderNotification(channel=channel, status='pending'))
+
+
+def _backoff(attempts):
+    config = current_app.config
+    delay = config['NOTIFY_BACKOFF_BASE'] * (2 ** max(0, attempts - 1))
+    return timedelta(seconds=min(delay, config['NOTIFY_BACKOFF_MAX']))
+
+
+def _claim_next(ids=None):
+    query = OrderNotification.query.filter(
+        OrderNotification.status == 'pending',
+        OrderNotification.next_attempt_at <= datetime.utcnow(),
+    )
+    if ids is not None:
+        query = query.filter(OrderNotification.id.in_(ids))
+    query = query.order_by(OrderNotification.next_attempt_at, OrderNotification.id)
+    notification = query.with_for_update(skip_locked=True).first()
+    if notification is not None:
+        # Lease the row instead of holding the lock through the network send;
+        # if this process dies, the row comes due again once the lease expires
+        notification.next_attempt_at = datetime.utcnow() + timedelta(seconds=current_app.config['NOTIFY_LEASE'])
+        db.session.commit()
+    return notification
+
+
+def deliver(notification):
+    sender = CHANNELS.get(notification.channel)
+    order = db.session.get(Order, notification.order_id, options=ORDER_DETAIL_LOADERS)
+    notification.attempts += 1
+    error = ''
+    if sender is None or order is None:
+        ok = False
+        error = f'Unknown channel {notification.channel}' if sender is None else 'Order not found'
+    else:
+        try:
+            ok = sender(order)
+            if not ok:
+                error = 'Sender reported failure, see application log'
+        except Exception as e:
+            ok = False
+            error = f'{type(e).__name__}: {e}'
+
+    if ok:
+        notification.status = 'sent'
+        notification.sent_at = datetime.utcnow()
+        notification.last_error = ''
+    elif notification.attempts >= current_app.config['NOTIFY_MAX_ATTEMPTS']:
+        notification.status = 'failed'
+        notification.last_error = error
+    else:
+        notification.next_attempt_at = datetime.utcnow() + _backoff(notification.attempts)
+        notification.last_error = error
+    db.session.commit()
+    return ok
+
+
+def dispatch_due(limit=50, ids=None, deadline=None):
+    processed = 0
+    while processed < limit:
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        notification = _claim_next(ids)
+        if notification is None:
+            db.session.rollback()
+            break
+        ok = deliver(notification)
+        current_app.logger.info(
+            f'Notification #{notification.id} ({notification.channel}) for order '
+            f'#{notification.order_id}: {"sent" if ok else notification.status}'
+        )
+        processed += 1
+    return processed
+
+
+def retry_notification(notification):
+    notification.status = 'pending'
+    notification.next_attempt_at = datetime.utcnow()
+    notification.attempts = 0
+    db.session.commit()
+
+
+def dispatch_after_response(notifications):
+    if current_app.config['NOTIFY_DISPATCH'] != 'inline':
+        return
+    app = current_app._get_current_object()
+    ids = [n.id for n in notifications]
+
+    def run():
+        # No new send starts after the budget; one already under way is
+        # bounded by its own SMTP/Telegram timeout
+        deadline = time.monotonic() + app.config['NOTIFY_INLINE_BUDGET']
+        with app.app_context():
+            try:
+                dispatch_due(limit=len(ids), ids=ids, deadline=deadline)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f'Notification dispatch FAILED: {type(e).__name__}: {e}')
+
+    @after_this_request
+    def schedule(response):
+        response.call_on_close(run)
+        return response
@@ -0,0 +1,32 @@
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from notifications import dispatch_due
+
+
+def run(once=False):
+    interval = app.config['NOTIFY_POLL_INTERVAL']
+    while True:
+        with app.app_context():
+            try:
+                processed = dispatch_due()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f'Notification dispatch FAILED: {type(e).__name__}: {e}')
+                processed = 0
+        if once:
+            return
+        if not processed:
+            time.sleep(interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deliver queued order notifications (email, Telegram)')
+    parser.add_argument('--once', action='store_true',
+                        help='Drain due notifications and exit, e.g. from cron')
+    args = parser.parse_args()
+    run(once=args.once)
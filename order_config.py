@@ -0,0 +1,74 @@
+from collections import namedtuple
+from types import MappingProxyType
+from sqlalchemy.orm import joinedload
+
+from cache import VersionedCache
+from models import Layout, PriceOption, Product
+
+
+# Categories whose wizard goes straight from parameters to contacts
+SKIP_LAYOUT_OSNASTKA_SLUGS = ('faksimile', 'ottisk')
+
+CategoryRef = namedtuple('CategoryRef', ['id', 'name', 'slug'])
+LayoutChoice = namedtuple('LayoutChoice', ['id', 'name', 'image', 'price'])
+PriceChoice = namedtuple('PriceChoice', ['id', 'osnastka_type', 'description', 'image', 'price_normal'])
+OrderConfig = namedtuple('OrderConfig', [
+    'id', 'name', 'description', 'image', 'is_active', 'category',
+    'layouts', 'price_options', 'layouts_by_id', 'price_options_by_id',
+    'skip_layout_osnastka', 'skip_layout', 'default_layout', 'default_price_option',
+])
+
+
+def _build_configs():
+    layouts = {}
+    for l in Layout.query.order_by(Layout.product_id, Layout.sort_order, Layout.id).all():
+        layouts.setdefault(l.product_id, []).append(
+            LayoutChoice(id=l.id, name=l.name, image=l.image, price=l.price)
+        )
+    price_options = {}
+    for po in PriceOption.query.order_by(PriceOption.product_id, PriceOption.sort_order, PriceOption.id).all():
+        price_options.setdefault(po.product_id, []).append(PriceChoice(
+            id=po.id,
+            osnastka_type=po.osnastka_type,
+            description=po.description,
+            image=po.image,
+            price_normal=po.price_normal,
+        ))
+
+    configs = {}
+    for p in Product.query.options(joinedload(Product.category)).all():
+        category = CategoryRef(id=p.category.id, name=p.category.name, slug=p.category.slug)
+        product_layouts = tuple(layouts.get(p.id, ()))
+        product_prices = tuple(price_options.get(p.id, ()))
+        configs[p.id] = OrderConfig(
+            id=p.id,
+            name=p.name,
+            description=p.description,
+            image=p.image,
+            is_active=bool(p.is_active),
+            category=category,
+            layouts=product_layouts,
+            price_options=product_prices,
+            layouts_by_id=MappingProxyType({l.id: l for l in product_layouts}),
+            price_options_by_id=MappingProxyType({po.id: po for po in product_prices}),
+            skip_layout_osnastka=category.slug in SKIP_LAYOUT_OSNASTKA_SLUGS,
+            skip_layout=not product_layouts,
+            default_layout=product_layouts[0] if product_layouts else None,
+            default_price_option=product_prices[0] if product_prices else None,
+        )
+    return MappingProxyType(configs)
+
+
+_order_config_cache = VersionedCache('order_config', _build_configs)
+
+
+def get_order_config(product_id):
+    return _order_config_cache.get().get(product_id)
+
+
+def all_order_configs():
+    return _order_config_cache.get()
+
+
+def invalidate_order_config():
+    _order_config_cache.invalidate()
@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+import re
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import select
+
+from models import db, Layout, Order, PriceOption, Product, ORDER_STATUS_LABELS
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+PARAM_LABELS = {
+    'ooo': 'ООО (наименование)',
+    'ogrn': 'ОГРН',
+    'ogrnip': 'ОГРНИП',
+    'inn': 'ИНН',
+    'city': 'Город',
+    'size': 'Размер (мм)',
+    'qty': 'Количество (шт)',
+    'fio': 'ФИО',
+    'spec': 'Специальность',
+    'text': 'Текст штампа',
+    'lines': 'Кол-во строк',
+    'message': 'Комментарий',
+}
+
+EXPORT_FORMATS = ('csv', 'xlsx') if openpyxl else ('csv',)
+BATCH_SIZE = 1000
+# Rows buffered before a CSV chunk is handed to the response
+FLUSH_EVERY = 200
+
+# The order's own message column already covers the wizard's comment
+_PARAM_KEYS = tuple(k for k in PARAM_LABELS if k != 'message')
+HEADER = (
+    ['№', 'Дата', 'Статус', 'Товар', 'Макет', 'Оснастка', 'Сумма', 'Имя', 'Телефон', 'Email',
+     'Доставка', 'Дата доставки', 'Адрес доставки', 'Комментарий']
+    + [PARAM_LABELS[k] for k in _PARAM_KEYS]
+)
+_FORMULA_RE = re.compile(r'^[=@\t\r]|^[+-](?![\d\s()+-]*$)')
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def _export_query(date_from=None, date_to=None, status=None):
+    stmt = (
+        select(Order.id, Order.created_at, Order.status, Product.name, Layout.name,
+               PriceOption.osnastka_type, Order.total_price, Order.name, Order.phone, Order.email,
+               Order.needs_delivery, Order.delivery_datetime, Order.delivery_address,
+               Order.message, Order.params_json)
+        .outerjoin(Product, Order.product_id == Product.id)
+        .outerjoin(Layout, Order.layout_id == Layout.id)
+        .outerjoin(PriceOption, Order.price_option_id == PriceOption.id)
+        .order_by(Order.created_at, Order.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    if date_from:
+        stmt = stmt.where(Order.created_at >= date_from)
+    if date_to:
+        stmt = stmt.where(Order.created_at < date_to + timedelta(days=1))
+    if status:
+        stmt = stmt.where(Order.status == status)
+    return stmt
+
+
+def _safe(value):
+    if isinstance(value, str) and _FORMULA_RE.match(value):
+        return "'" + value
+    return value
+
+
+def _row(r):
+    (order_id, created_at, status, product, layout, osnastka, total, name, phone, email,
+     needs_delivery, delivery_datetime, delivery_address, message, params_json) = r
+    try:
+        params = json.loads(params_json) if params_json else {}
+    except (ValueError, TypeError):
+        params = {}
+    if not isinstance(params, dict):
+        params = {}
+    values = [
+        order_id, created_at.strftime('%Y-%m-%d %H:%M') if created_at else '',
+        ORDER_STATUS_LABELS.get(status, status), product or '', layout or '', osnastka or '',
+        total if total is not None else '', name, phone, email or '',
+        'Да' if needs_delivery else 'Нет', delivery_datetime or '', delivery_address or '',
+        message or '',
+    ]
+    values += [str(params.get(k, '')) for k in _PARAM_KEYS]
+    return [_safe(v) for v in values]
+
+
+def iter_order_rows(date_from=None, date_to=None, status=None):
+    result = db.session.execute(_export_query(date_from, date_to, status))
+    try:
+        for r in result:
+            yield _row(r)
+    finally:
+        result.close()
+
+
+def iter_csv(date_from=None, date_to=None, status=None):
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=';')
+    # BOM and ';' so Excel opens the Cyrillic columns correctly
+    buf.write('\ufeff')
+    writer.writerow(HEADER)
+    yield buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+
+    pending = 0
+    for row in iter_order_rows(date_from, date_to, status):
+        writer.writerow(row)
+        pending += 1
+        if pending == FLUSH_EVERY:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    if pending:
+        yield buf.getvalue()
+
+
+def iter_xlsx(date_from=None, date_to=None, status=None, chunk_size=64 * 1024):
+    # A zip can't be emitted before it is complete; write-only mode still keeps
+    # memory flat, and the file is spooled to disk and streamed from there.
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Заказы')
+    ws.append(HEADER)
+    for row in iter_order_rows(date_from, date_to, status):
+        ws.append(row)
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_filename(fmt, date_from=None, date_to=None, status=None):
+    parts = ['orders']
+    if date_from or date_to:
+        parts.append(f'{date_from:%Y%m%d}' if date_from else 'start')
+        parts.append(f'{date_to:%Y%m%d}' if date_to else datetime.utcnow().strftime('%Y%m%d'))
+    if status:
+        parts.append(status)
+    return '_'.join(parts) + '.' + fmt
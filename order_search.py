@@ -0,0 +1,114 @@
+import re
+from sqlalchemy import Column, Index, MetaData, Table, Text, func, inspect, literal_column, or_, select, text
+
+from migrations import create_index_online
+from models import db, Order, normalize_phone
+
+
+TS_CONFIG = "'russian'::regconfig"
+BACKFILL_BATCH = 500
+
+# Built with CREATE INDEX CONCURRENTLY; the table here only describes
+# the column for DDL and is not part of the app's metadata.
+_PG_SEARCH_TABLE = Table(
+    'orders', MetaData(),
+    Column('search_text', Text),
+    Index('ix_orders_search_fts',
+          func.to_tsvector(literal_column(TS_CONFIG),
+                           func.coalesce(literal_column('search_text'), literal_column("''"))),
+          postgresql_using='gin'),
+    Index('ix_orders_search_trgm', 'search_text',
+          postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+)
+
+# External-content FTS5 table: it stores only the trigram index and reads
+# the text from orders.search_text, kept in step by the triggers below.
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5("
+    "search_text, content='orders', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS orders_fts_ai AFTER INSERT ON orders BEGIN "
+    "INSERT INTO orders_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS orders_fts_ad AFTER DELETE ON orders BEGIN "
+    "INSERT INTO orders_fts(orders_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS orders_fts_au AFTER UPDATE ON orders BEGIN "
+    "INSERT INTO orders_fts(orders_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO orders_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+)
+
+_PHONE_QUERY_RE = re.compile(r'^[\d\s()+\-]+$')
+
+
+def _backfill_search_text():
+    while True:
+        orders = (Order.query.filter(Order.search_text.is_(None))
+                  .order_by(Order.id).limit(BACKFILL_BATCH).all())
+        if not orders:
+            return
+        for order in orders:
+            order.search_text = order.build_search_text()
+        db.session.commit()
+
+
+def install_order_search():
+    engine = db.engine
+    columns = {c['name'] for c in inspect(engine).get_columns('orders')}
+    if 'search_text' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE orders ADD COLUMN search_text TEXT'))
+    _backfill_search_text()
+
+    # Errors propagate so that upgrade_schema does not record the migration
+    # and retries it on the next start.
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        with engine.begin() as conn:
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for index in sorted(_PG_SEARCH_TABLE.indexes, key=lambda i: i.name):
+            create_index_online(index)
+    elif dialect == 'sqlite':
+        with engine.begin() as conn:
+            # Dropping orders drops its triggers but not orders_fts, so a
+            # missing trigger means the index has to be rebuilt from scratch.
+            stale = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'orders_fts_ai'"
+            )).first() is None
+            for stmt in _SQLITE_DDL:
+                conn.execute(text(stmt))
+            if stale:
+                conn.execute(text("INSERT INTO orders_fts(orders_fts) VALUES ('rebuild')"))
+
+
+def _like_pattern(value):
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def order_search_filter(q):
+    q = ' '.join(q.split()).lower()
+    if not q:
+        return None
+    terms = [q]
+    if _PHONE_QUERY_RE.match(q):
+        digits = normalize_phone(q)
+        if digits and digits != q:
+            terms.append(digits)
+        # Phones are indexed in the +7 form; a partial number typed with
+        # the trunk prefix 8 has to be looked up that way too
+        if len(digits) > 1 and digits.startswith('8'):
+            terms.append('7' + digits[1:])
+
+    dialect = db.engine.dialect.name
+    clauses = []
+    if dialect == 'postgresql':
+        clauses = [text(f"to_tsvector({TS_CONFIG}, coalesce(orders.search_text, '')) "
+                        f"@@ plainto_tsquery({TS_CONFIG}, :search_q)").bindparams(search_q=q)]
+        clauses.extend(Order.search_text.ilike(_like_pattern(t), escape='\\') for t in terms)
+    elif dialect == 'sqlite' and len(q) >= 3:
+        match = ' OR '.join('"' + t.replace('"', '""') + '"' for t in terms)
+        fts_ids = select(literal_column('rowid')).select_from(text('orders_fts')).where(
+            text('orders_fts MATCH :search_match').bindparams(search_match=match)
+        )
+        clauses.append(Order.id.in_(fts_ids))
+    else:
+        clauses.extend(Order.search_text.like(_like_pattern(t), escape='\\') for t in terms)
+    return or_(*clauses)
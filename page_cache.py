@@ -0,0 +1,61 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, session, make_response
+
+from cache import get_version
+
+
+PAGE_CACHE_DEPENDENCIES = ('site_settings', 'catalog')
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_key():
+    args = tuple(sorted((request.view_args or {}).items()))
+    return (request.host_url, request.endpoint, args)
+
+
+def _versions():
+    return tuple(get_version(name) for name in PAGE_CACHE_DEPENDENCIES)
+
+
+def _build_response(body, mimetype, etag):
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = (
+        f"public, max-age={current_app.config['PAGE_CACHE_MAX_AGE']}, must-revalidate"
+    )
+    return response.make_conditional(request)
+
+
+def cached_page(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if (request.method != 'GET' or not current_app.config['PAGE_CACHE_ENABLED']
+                or session.get('_flashes')):
+            return view(*args, **kwargs)
+
+        key = _cache_key()
+        versions = _versions()
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None:
+                _entries.move_to_end(key)
+        if entry is not None and entry[0] == versions:
+            return _build_response(entry[1], entry[2], entry[3])
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.direct_passthrough:
+            return response
+        body = response.get_data()
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with _lock:
+            _entries[key] = (versions, body, response.mimetype, etag)
+            _entries.move_to_end(key)
+            while len(_entries) > current_app.config['PAGE_CACHE_MAX_ENTRIES']:
+                _entries.popitem(last=False)
+        return _build_response(body, response.mimetype, etag)
+    return wrapped
@@ -14,4 +14,9 @@ for pattern in venv_patterns:
         if sp not in sys.path:
             sys.path.insert(0, sp)
 
+# Passenger cannot keep notify_worker.py running; drain the notification
+# queue from cron instead:
+#   * * * * * cd ~/pechati && venv/bin/python notify_worker.py --once
+# NOTIFY_DISPATCH=inline additionally sends each new order's notifications
+# right after the response, so they don't wait for the next cron run.
 from app import app as application
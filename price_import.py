@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+from datetime import datetime
+from collections import namedtuple
+from sqlalchemy import Float, Integer, case, column, update, values
+
+from models import db, Layout, PriceOption, Product
+from order_config import invalidate_order_config
+
+
+COLUMNS = ('product', 'osnastka_type', 'layout', 'price')
+# Rows per UPDATE statement; keeps bind parameters well under SQLite's limit
+CHUNK_SIZE = 5000
+
+PriceChange = namedtuple('PriceChange', ['kind', 'id', 'product_id', 'product', 'item', 'old', 'new'])
+
+
+class PriceImportError(ValueError):
+    pass
+
+
+def _clean(value):
+    return str(value).strip() if value is not None else ''
+
+
+def parse_price_file(filename, data):
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            data = data.decode('cp1251')
+    if filename.lower().endswith('.json'):
+        try:
+            rows = json.loads(data)
+        except ValueError as e:
+            raise PriceImportError(f'Некорректный JSON: {e}')
+        if isinstance(rows, dict):
+            rows = rows.get('prices', [])
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise PriceImportError('JSON должен быть списком объектов')
+    else:
+        try:
+            dialect = csv.Sniffer().sniff(data[:4096], delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(io.StringIO(data), dialect=dialect)
+        rows = [dict(row, line=reader.line_num) for row in reader]
+    parsed = []
+    for i, row in enumerate(rows, start=1):
+        clean = {k: _clean(row.get(k)) for k in COLUMNS}
+        if any(clean.values()):
+            clean['line'] = row.get('line', i)
+            parsed.append(clean)
+    return parsed
+
+
+def plan_price_changes(rows):
+    products = {}
+    for p in Product.query.with_entities(Product.id, Product.name).all():
+        products[str(p.id)] = products[p.name.strip().lower()] = p
+    options = {(po.product_id, po.osnastka_type.strip().lower()): po
+               for po in PriceOption.query.with_entities(
+                   PriceOption.id, PriceOption.product_id, PriceOption.osnastka_type,
+                   PriceOption.price_normal)}
+    layouts = {(l.product_id, l.name.strip().lower()): l
+               for l in Layout.query.with_entities(Layout.id, Layout.product_id, Layout.name, Layout.price)}
+
+    changes, errors, seen = [], [], set()
+    for row in rows:
+        line = row.get('line', '?')
+        product = products.get(row['product'].lower())
+        if product is None:
+            errors.append(f'Строка {line}: товар «{row["product"]}» не найден')
+            continue
+        try:
+            price = float(row['price'].replace(' ', '').replace(',', '.'))
+        except ValueError:
+            errors.append(f'Строка {line}: некорректная цена «{row["price"]}»')
+            continue
+        if price < 0:
+            errors.append(f'Строка {line}: цена не может быть отрицательной')
+            continue
+        if bool(row['osnastka_type']) == bool(row['layout']):
+            errors.append(f'Строка {line}: укажите либо оснастку, либо макет')
+            continue
+
+        if row['osnastka_type']:
+            kind, item = 'option', row['osnastka_type']
+            target = options.get((product.id, item.lower()))
+            old = target.price_normal if target else None
+        else:
+            kind, item = 'layout', row['layout']
+            target = layouts.get((product.id, item.lower()))
+            old = target.price if target else None
+        if target is None:
+            errors.append(f'Строка {line}: у товара «{product.name}» нет позиции «{item}»')
+            continue
+        if (kind, target.id) in seen:
+            errors.append(f'Строка {line}: позиция «{item}» товара «{product.name}» указана повторно')
+            continue
+        seen.add((kind, target.id))
+        if old is None or abs(old - price) >= 0.005:
+            changes.append(PriceChange(kind, target.id, product.id, product.name, item, old, price))
+    return changes, errors
+
+
+def export_price_rows():
+    rows = []
+    products = dict(Product.query.with_entities(Product.id, Product.name).all())
+    for po in PriceOption.query.order_by(PriceOption.product_id, PriceOption.sort_order, PriceOption.id):
+        rows.append({'product': products[po.product_id], 'osnastka_type': po.osnastka_type,
+                     'layout': '', 'price': po.price_normal})
+    for l in Layout.query.order_by(Layout.product_id, Layout.sort_order, Layout.id):
+        rows.append({'product': products[l.product_id], 'osnastka_type': '',
+                     'layout': l.name, 'price': l.price})
+    return rows
+
+
+def _update_statements(table, price_column, pairs, dialect):
+    for i in range(0, len(pairs), CHUNK_SIZE):
+        chunk = pairs[i:i + CHUNK_SIZE]
+        if dialect == 'postgresql':
+            v = values(column('id', Integer), column('price', Float), name='v').data(chunk)
+            yield (update(table).where(table.c.id == v.c.id)
+                   .values({price_column: v.c.price}))
+        else:
+            # SQLite and MySQL can't alias VALUES columns here; a CASE is still one statement
+            yield (update(table).where(table.c.id.in_([pk for pk, _ in chunk]))
+                   .values({price_column: case(dict(chunk), value=table.c.id)}))
+
+
+def apply_price_changes(changes):
+    dialect = db.engine.dialect.name
+    targets = (
+        (PriceOption.__table__, 'price_normal', 'option'),
+        (Layout.__table__, 'price', 'layout'),
+    )
+    try:
+        for table, price_column, kind in targets:
+            pairs = [(c.id, c.new) for c in changes if c.kind == kind]
+            for stmt in _update_statements(table, price_column, pairs, dialect):
+                db.session.execute(stmt)
+        if changes:
+            db.session.execute(update(Product.__table__)
+                               .where(Product.id.in_({c.product_id for c in changes}))
+                               .values(updated_at=datetime.utcnow()))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_order_config()
+    return len(changes)
@@ -0,0 +1,91 @@
+import hashlib
+import json
+from collections import namedtuple
+
+from cache import VersionedCache
+from order_config import all_order_configs
+
+
+DEFAULT_LAYOUT_PRICE = 750
+DELIVERY_FEE = 500
+MAX_QTY = 10000
+
+# units maps (layout_id, price_option_id) -> price of one item; None stands
+# for "nothing chosen" on either axis, so every request resolves to a cell.
+PriceMatrix = namedtuple('PriceMatrix', ['product_id', 'units', 'default_layout_id',
+                                         'default_price_option_id', 'json', 'etag'])
+
+
+def parse_qty(value):
+    try:
+        qty = int(value or 1)
+    except (ValueError, TypeError):
+        return 1
+    return min(max(1, qty), MAX_QTY)
+
+
+def _build_matrix(config):
+    charges_layout = not (config.skip_layout_osnastka or config.skip_layout)
+    layout_prices = {None: DEFAULT_LAYOUT_PRICE if charges_layout else 0}
+    for l in config.layouts:
+        layout_prices[l.id] = (l.price if l.price is not None else DEFAULT_LAYOUT_PRICE) if charges_layout else 0
+    option_prices = {None: 0}
+    for po in config.price_options:
+        option_prices[po.id] = po.price_normal or 0
+
+    units = {(lid, pid): lp + pp
+             for lid, lp in layout_prices.items()
+             for pid, pp in option_prices.items()}
+    default_layout_id = config.default_layout.id if config.default_layout else None
+    default_price_option_id = config.default_price_option.id if config.default_price_option else None
+
+    payload = {
+        'product_id': config.id,
+        'delivery_fee': DELIVERY_FEE,
+        'default_layout_id': default_layout_id,
+        'default_price_option_id': default_price_option_id,
+        'units': {
+            '' if lid is None else str(lid): {'' if pid is None else str(pid): units[(lid, pid)]
+                                              for pid in option_prices}
+            for lid in layout_prices
+        },
+    }
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    return PriceMatrix(
+        product_id=config.id,
+        units=units,
+        default_layout_id=default_layout_id,
+        default_price_option_id=default_price_option_id,
+        json=body,
+        etag=hashlib.sha256(body.encode('utf-8')).hexdigest()[:32],
+    )
+
+
+def _build_matrices():
+    return {pid: _build_matrix(config) for pid, config in all_order_configs().items()}
+
+
+# Shares the order_config stamp, so it is rebuilt whenever the wizard config is
+_matrix_cache = VersionedCache('order_config', _build_matrices)
+
+
+def get_price_matrix(product_id):
+    return _matrix_cache.get().get(product_id)
+
+
+def quote(matrix, layout_id, price_option_id, qty=1, delivery=False):
+    if (layout_id, None) not in matrix.units:
+        layout_id = None
+    if (None, price_option_id) not in matrix.units:
+        price_option_id = None
+    unit = matrix.units[(layout_id, price_option_id)]
+    qty = parse_qty(qty)
+    delivery_fee = DELIVERY_FEE if delivery else 0
+    return {
+        'layout_id': layout_id,
+        'price_option_id': price_option_id,
+        'unit_price': unit,
+        'qty': qty,
+        'delivery_fee': delivery_fee,
+        'total': unit * qty + delivery_fee,
+    }
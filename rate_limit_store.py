@@ -0,0 +1,96 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+
+# Token bucket: each key holds up to `limit` tokens and regains `limit`
+# tokens per `window` seconds. A bucket idle for a whole window is full
+# again, so its row carries no information and can be dropped.
+
+
+class SQLiteRateStore:
+    def __init__(self, path, purge_every=500):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_updated ON buckets (updated)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key, limit, window):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = float(limit)
+            if row is not None:
+                tokens = min(float(limit), row[0] + (now - row[1]) * limit / window)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            if random.randrange(self.purge_every) == 0:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - window,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+
+_REDIS_TOKEN_BUCKET = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = limit
+if state[1] then
+    tokens = math.min(limit, tonumber(state[1]) + (now - tonumber(state[2])) * limit / window)
+end
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(window))
+return allowed
+"""
+
+
+class RedisRateStore:
+    def __init__(self, url, prefix='ratelimit:'):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    def hit(self, key, limit, window):
+        return bool(self._script(keys=[self.prefix + key], args=[limit, window, time.time()]))
+
+
+def make_rate_store(config):
+    backend = config['RATE_LIMIT_BACKEND']
+    if backend == 'redis':
+        return RedisRateStore(config['RATE_LIMIT_REDIS_URL'])
+    if backend == 'sqlite':
+        return SQLiteRateStore(config['RATE_LIMIT_DB'])
+    raise ValueError(f'Unknown RATE_LIMIT_BACKEND: {backend}')
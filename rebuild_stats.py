@@ -0,0 +1,18 @@
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from stats import rebuild_stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recompute the order status counters and daily rollups from the orders table')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Orders fetched per round trip')
+    args = parser.parse_args()
+    started = time.monotonic()
+    with app.app_context():
+        total = rebuild_stats(batch_size=args.batch_size)
+    print(f'Done: {total} orders in {time.monotonic() - started:.1f}s')
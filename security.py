@@ -1,13 +1,26 @@
-import time
 import uuid
 import os
+import hashlib
 from functools import wraps
-from flask import request, abort
+from flask import current_app, request, abort
+
+from rate_limit_store import make_rate_store
+from uploads import upload_path
 
 
 RATE_WINDOW = 60
 
-_rate_storage = {}
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+_MAGIC_BYTES = {
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'pdf': (b'%PDF-',),
+}
+
+_rate_store_instance = None
 
 
 def allowed_file(filename, allowed_extensions):
@@ -17,18 +30,50 @@ def allowed_file(filename, allowed_extensions):
     return ext in allowed_extensions
 
 
+def content_matches_extension(head, ext):
+    if ext == 'svg':
+        text = head.lstrip(b'\xef\xbb\xbf').lstrip().lower()
+        return text.startswith(b'<') and b'<svg' in text
+    signatures = _MAGIC_BYTES.get(ext)
+    if signatures is None:
+        return False
+    return any(head.startswith(sig) for sig in signatures)
+
+
 def safe_save_upload(file_storage, upload_folder, allowed_extensions):
     if not file_storage or not getattr(file_storage, 'filename', None) or not file_storage.filename.strip():
         return None
     if not allowed_file(file_storage.filename, allowed_extensions):
         return None
     ext = file_storage.filename.rsplit('.', 1)[-1].lower()
-    safe_name = f'{uuid.uuid4().hex}.{ext}'
-    path = os.path.join(upload_folder, safe_name)
+    stream = file_storage.stream
+    head = stream.read(UPLOAD_CHUNK_SIZE)
+    if not head or not content_matches_extension(head, ext):
+        return None
+
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(upload_folder, f'.{uuid.uuid4().hex}.part')
     try:
-        file_storage.save(path)
+        with open(tmp_path, 'wb') as out:
+            chunk = head
+            while chunk:
+                digest.update(chunk)
+                out.write(chunk)
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        safe_name = f'{digest.hexdigest()}.{ext}'
+        path = upload_path(upload_folder, safe_name)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            # Same bytes as an earlier upload: refresh it so the upload GC
+            # grace period counts from this use
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
         return safe_name
     except (OSError, PermissionError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
 
 
@@ -59,27 +104,31 @@ def apply_security_headers(response):
     return response
 
 
-def _rate_key(prefix):
-    ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-    if ip and ',' in ip:
-        ip = ip.split(',')[0].strip()
-    return f"{prefix}:{ip}"
+def client_ip():
+    # Only the last TRUSTED_PROXY_COUNT X-Forwarded-For entries were added by
+    # our own proxies; anything to the left of them is client-controlled.
+    trusted = current_app.config['TRUSTED_PROXY_COUNT']
+    if trusted > 0:
+        forwarded = [p.strip() for p in request.headers.get('X-Forwarded-For', '').split(',') if p.strip()]
+        if len(forwarded) >= trusted:
+            return forwarded[-trusted]
+    return request.remote_addr
+
+
+def _rate_store():
+    global _rate_store_instance
+    if _rate_store_instance is None:
+        _rate_store_instance = make_rate_store(current_app.config)
+    return _rate_store_instance
 
 
 def check_rate_limit(prefix, max_requests):
-    key = _rate_key(prefix)
-    now = time.time()
-    if key not in _rate_storage:
-        _rate_storage[key] = (1, now)
-        return True
-    count, start = _rate_storage[key]
-    if now - start > RATE_WINDOW:
-        _rate_storage[key] = (1, now)
+    key = f'{prefix}:{client_ip()}'
+    try:
+        return _rate_store().hit(key, max_requests, RATE_WINDOW)
+    except Exception as e:
+        current_app.logger.error(f'Rate limit backend FAILED, allowing request: {type(e).__name__}: {e}')
         return True
-    if count >= max_requests:
-        return False
-    _rate_storage[key] = (count + 1, start)
-    return True
 
 
 def rate_limit(prefix, max_requests):
@@ -93,21 +142,21 @@ def rate_limit(prefix, max_requests):
     return decorator
 
 
-def layout_belongs_to_product(layout_id, product_id, layouts_query):
+def layout_belongs_to_product(layout_id, product_id, layouts_by_id):
     if not layout_id:
         return False
     try:
         lid = int(layout_id)
     except (ValueError, TypeError):
         return False
-    return any(l.id == lid for l in layouts_query)
+    return lid in layouts_by_id
 
 
-def price_option_belongs_to_product(price_option_id, product_id, price_options_query):
+def price_option_belongs_to_product(price_option_id, product_id, price_options_by_id):
     if not price_option_id:
         return False
     try:
         pid = int(price_option_id)
     except (ValueError, TypeError):
         return False
-    return any(p.id == pid for p in price_options_query)
+    return pid in price_options_by_id
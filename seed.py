@@ -1,6 +1,9 @@
 import os
 from app import app, db
 from models import Category, Product, PriceOption, Layout, SiteSetting, Admin
+from catalog_cache import invalidate_catalog
+from order_config import invalidate_order_config
+from migrations import upgrade_schema
 
 ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'change-me')
@@ -9,7 +12,7 @@ ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'change-me')
 def seed():
     with app.app_context():
         db.drop_all()
-        db.create_all()
+        upgrade_schema()
 
         PriceOption.query.delete()
         Layout.query.delete()
@@ -111,6 +114,9 @@ def seed():
             admin.set_password(ADMIN_PASSWORD)
             db.session.add(admin)
         db.session.commit()
+        SiteSetting.invalidate_cache()
+        invalidate_catalog()
+        invalidate_order_config()
 
 
 if __name__ == '__main__':
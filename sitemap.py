@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from xml.sax.saxutils import escape
+from flask import current_app, request, url_for
+
+from cache import get_version
+from models import Category, Product
+
+
+# Catalog edits bump 'catalog', layout/price edits bump 'order_config'
+SITEMAP_DEPENDENCIES = ('catalog', 'order_config')
+
+Sitemap = namedtuple('Sitemap', ['xml', 'gz', 'etag', 'last_modified'])
+
+# Without SITE_URL the base comes from the Host header; keep only a few
+MAX_HOSTS = 4
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def _url(loc, lastmod=None, changefreq=None, priority=None):
+    parts = ['  <url>', f'    <loc>{escape(loc)}</loc>']
+    if lastmod:
+        parts.append(f'    <lastmod>{lastmod.strftime("%Y-%m-%dT%H:%M:%S+00:00")}</lastmod>')
+    if changefreq:
+        parts.append(f'    <changefreq>{changefreq}</changefreq>')
+    if priority:
+        parts.append(f'    <priority>{priority}</priority>')
+    parts.append('  </url>')
+    return '\n'.join(parts)
+
+
+def _build(base):
+    categories = (Category.query
+                  .with_entities(Category.id, Category.slug, Category.updated_at)
+                  .filter_by(is_active=True)
+                  .order_by(Category.sort_order, Category.id).all())
+    active = {c.id for c in categories}
+    products = [p for p in (Product.query
+                            .with_entities(Product.id, Product.category_id, Product.updated_at)
+                            .filter_by(is_active=True)
+                            .order_by(Product.sort_order, Product.id).all())
+                if p.category_id in active]
+
+    category_lastmod = {c.id: c.updated_at for c in categories}
+    for p in products:
+        if p.updated_at and (category_lastmod[p.category_id] is None
+                             or p.updated_at > category_lastmod[p.category_id]):
+            category_lastmod[p.category_id] = p.updated_at
+    site_lastmod = max((d for d in category_lastmod.values() if d), default=None)
+
+    urls = [
+        _url(base + '/', site_lastmod, 'weekly', '1.0'),
+        _url(base + url_for('catalog_all'), site_lastmod, 'weekly', '0.9'),
+        _url(base + url_for('about'), changefreq='monthly', priority='0.7'),
+        _url(base + url_for('contacts'), changefreq='monthly', priority='0.7'),
+        _url(base + url_for('delivery'), changefreq='monthly', priority='0.7'),
+        _url(base + url_for('policy'), changefreq='yearly', priority='0.3'),
+    ]
+    urls += [_url(base + url_for('catalog', slug=c.slug), category_lastmod[c.id], 'weekly', '0.8')
+             for c in categories]
+    urls += [_url(base + url_for('order_product', product_id=p.id), p.updated_at, 'monthly', '0.6')
+             for p in products]
+
+    xml = '\n'.join([
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+        *urls,
+        '</urlset>',
+    ]).encode('utf-8')
+    return Sitemap(
+        xml=xml,
+        # mtime=0 keeps the archive byte-identical between rebuilds and workers
+        gz=gzip.compress(xml, compresslevel=9, mtime=0),
+        etag=hashlib.sha256(xml).hexdigest()[:32],
+        last_modified=site_lastmod,
+    )
+
+
+def get_sitemap():
+    base = (current_app.config['SITE_URL'] or request.url_root).rstrip('/')
+    versions = tuple(get_version(name) for name in SITEMAP_DEPENDENCIES)
+    entry = _entries.get(base)
+    if entry is not None and entry[0] == versions:
+        return entry[1]
+    with _lock:
+        entry = _entries.get(base)
+        if entry is None or entry[0] != versions:
+            entry = _entries[base] = (versions, _build(base))
+        _entries.move_to_end(base)
+        while len(_entries) > MAX_HOSTS:
+            _entries.popitem(last=False)
+    return entry[1]
+
+
+def sitemap_response(gzipped=False):
+    sitemap = get_sitemap()
+    if gzipped:
+        response = current_app.response_class(sitemap.gz, mimetype='application/gzip')
+        etag = sitemap.etag + '-gz'
+    elif request.accept_encodings['gzip']:
+        response = current_app.response_class(sitemap.gz, mimetype='application/xml')
+        response.headers['Content-Encoding'] = 'gzip'
+        etag = sitemap.etag + '-gz'
+    else:
+        response = current_app.response_class(sitemap.xml, mimetype='application/xml')
+        etag = sitemap.etag
+    if not gzipped:
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if sitemap.last_modified:
+        response.last_modified = sitemap.last_modified
+    response.headers['Cache-Control'] = (
+        f"public, max-age={current_app.config['PAGE_CACHE_MAX_AGE']}, must-revalidate"
+    )
+    return response.make_conditional(request)
@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import db, Order, OrderDailyStat, OrderStatusCount, Product, Category
+
+
+def _revenue(status, total_price):
+    return 0.0 if status == 'cancelled' else float(total_price or 0)
+
+
+def _add_daily(daily, created_at, product_id, category_id, orders, revenue):
+    day = created_at.date()
+    for scope, ref_id in (('all', 0), ('product', product_id), ('category', category_id)):
+        if scope != 'all' and not ref_id:
+            continue
+        row = daily.setdefault((day, scope, ref_id), [0, 0.0])
+        row[0] += orders
+        row[1] += revenue
+
+
+def _increment(connection, table, keys, values):
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+        stmt = insert(table).values(**keys, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={c: table.c[c] + stmt.excluded[c] for c in values},
+        )
+        connection.execute(stmt)
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql_insert(table).values(**keys, **values)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in values})
+        connection.execute(stmt)
+    else:
+        stmt = update(table).values({c: table.c[c] + v for c, v in values.items()})
+        for k, v in keys.items():
+            stmt = stmt.where(table.c[k] == v)
+        if connection.execute(stmt).rowcount == 0:
+            connection.execute(table.insert().values(**keys, **values))
+
+
+def _apply(connection, statuses, daily):
+    status_table = OrderStatusCount.__table__
+    daily_table = OrderDailyStat.__table__
+    for status, delta in statuses.items():
+        if delta:
+            _increment(connection, status_table, {'status': status}, {'count': delta})
+    for (day, scope, ref_id), (orders, revenue) in daily.items():
+        if orders or revenue:
+            _increment(connection, daily_table, {'day': day, 'scope': scope, 'ref_id': ref_id},
+                       {'orders': orders, 'revenue': revenue})
+
+
+def _category_ids(connection, product_ids):
+    product_ids = {pid for pid in product_ids if pid}
+    if not product_ids:
+        return {}
+    rows = connection.execute(select(Product.id, Product.category_id).where(Product.id.in_(product_ids)))
+    return dict(rows.all())
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_order_stats(session, flush_context):
+    added = [o for o in session.new if isinstance(o, Order)]
+    removed = [o for o in session.deleted if isinstance(o, Order)]
+    changed = []
+    for o in session.dirty:
+        if isinstance(o, Order):
+            history = inspect(o).attrs.status.history
+            if history.has_changes() and history.deleted:
+                changed.append((o, history.deleted[0], o.status))
+    if not (added or removed or changed):
+        return
+
+    connection = session.connection()
+    categories = _category_ids(connection, [o.product_id for o in added + removed]
+                               + [o.product_id for o, _, _ in changed])
+    statuses = {}
+    daily = {}
+    for sign, orders in ((1, added), (-1, removed)):
+        for o in orders:
+            statuses[o.status] = statuses.get(o.status, 0) + sign
+            _add_daily(daily, o.created_at, o.product_id, categories.get(o.product_id),
+                       sign, sign * _revenue(o.status, o.total_price))
+    for o, old_status, new_status in changed:
+        statuses[old_status] = statuses.get(old_status, 0) - 1
+        statuses[new_status] = statuses.get(new_status, 0) + 1
+        _add_daily(daily, o.created_at, o.product_id, categories.get(o.product_id), 0,
+                   _revenue(new_status, o.total_price) - _revenue(old_status, o.total_price))
+    _apply(connection, statuses, daily)
+
+
+def rebuild_stats(batch_size=1000):
+    connection = db.session.connection()
+    categories = dict(connection.execute(select(Product.id, Product.category_id)).all())
+    statuses = {}
+    daily = {}
+    rows = db.session.execute(
+        select(Order.status, Order.created_at, Order.product_id, Order.total_price)
+        .execution_options(yield_per=batch_size)
+    )
+    total = 0
+    for status, created_at, product_id, total_price in rows:
+        statuses[status] = statuses.get(status, 0) + 1
+        _add_daily(daily, created_at, product_id, categories.get(product_id), 1,
+                   _revenue(status, total_price))
+        total += 1
+    db.session.execute(OrderStatusCount.__table__.delete())
+    db.session.execute(OrderDailyStat.__table__.delete())
+    if statuses:
+        db.session.execute(OrderStatusCount.__table__.insert(),
+                           [{'status': s, 'count': n} for s, n in statuses.items()])
+    if daily:
+        db.session.execute(OrderDailyStat.__table__.insert(), [
+            {'day': day, 'scope': scope, 'ref_id': ref_id, 'orders': orders, 'revenue': revenue}
+            for (day, scope, ref_id), (orders, revenue) in daily.items()
+        ])
+    db.session.commit()
+    return total
+
+
+def order_count(status=None):
+    query = db.session.query(func.coalesce(func.sum(OrderStatusCount.count), 0))
+    if status:
+        query = query.filter(OrderStatusCount.status == status)
+    return int(query.scalar())
+
+
+def dashboard_stats(days=30):
+    # Rollup days come from created_at, which is stored in UTC
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    statuses = dict(db.session.query(OrderStatusCount.status, OrderStatusCount.count))
+
+    per_day = {row.day: row for row in OrderDailyStat.query.filter(
+        OrderDailyStat.scope == 'all', OrderDailyStat.day >= since)}
+    series = []
+    for i in range(days):
+        day = since + timedelta(days=i)
+        row = per_day.get(day)
+        series.append((day, row.orders if row else 0, row.revenue if row else 0.0))
+    peak = max((orders for _, orders, _ in series), default=0)
+
+    def top(scope, model, limit=5):
+        revenue = func.sum(OrderDailyStat.revenue)
+        rows = (db.session.query(OrderDailyStat.ref_id, func.sum(OrderDailyStat.orders), revenue)
+                .filter(OrderDailyStat.scope == scope, OrderDailyStat.day >= since)
+                .group_by(OrderDailyStat.ref_id)
+                .order_by(revenue.desc())
+                .limit(limit).all())
+        names = dict(db.session.query(model.id, model.name).filter(model.id.in_([r[0] for r in rows])))
+        return [(names.get(ref_id, f'#{ref_id}'), orders, revenue) for ref_id, orders, revenue in rows]
+
+    return {
+        'statuses': statuses,
+        'orders_total': sum(statuses.values()),
+        'series': series,
+        'peak': peak,
+        'period_orders': sum(orders for _, orders, _ in series),
+        'period_revenue': sum(revenue for _, _, revenue in series),
+        'top_products': top('product', Product),
+        'top_categories': top('category', Category),
+    }
@@ -0,0 +1,14 @@
+module.exports = {
+    content: ['./templates/**/*.html', './static/js/**/*.js', './images.py'],
+    theme: {
+        extend: {
+            colors: {
+                primary: { 50:'#eff6ff',100:'#dbeafe',200:'#bfdbfe',300:'#93c5fd',400:'#60a5fa',500:'#3b82f6',600:'#2563eb',700:'#1d4ed8',800:'#1e40af',900:'#1e3a8a' },
+                accent: { 50:'#fef3c7',100:'#fde68a',200:'#fcd34d',300:'#fbbf24',400:'#f59e0b',500:'#d97706' }
+            },
+            fontFamily: {
+                sans: ['Inter', 'system-ui', 'sans-serif']
+            }
+        }
+    }
+}
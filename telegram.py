@@ -1,8 +1,10 @@
 import os
 import json
-import requests
 from flask import current_app
 
+from telegram_client import get_client
+from uploads import attachment_path
+
 
 PARAM_TRANSLATIONS = {
     'inn': 'ИНН',
@@ -45,12 +47,29 @@ def _translate_key(key):
     return PARAM_TRANSLATIONS.get(k, key)
 
 
-def send_order_telegram(order):
+def _client():
     token = os.getenv('TELEGRAM_BOT_TOKEN', '')
     chat_id = os.getenv('TELEGRAM_CHAT_ID', '')
 
     if not token or not chat_id:
         current_app.logger.warning('TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID not set — skipping Telegram notification')
+        return None, None
+
+    client = get_client(
+        token,
+        api_url=os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org'),
+        chat_rate=float(os.getenv('TELEGRAM_CHAT_RATE', 1)),
+    )
+    return client, chat_id
+
+
+def order_files(order):
+    return [f for f in (order.file_path, getattr(order, 'file_path_step3', '') or '') if f]
+
+
+def send_order_telegram(order):
+    client, chat_id = _client()
+    if client is None:
         return False
 
     product_name = order.product.name if order.product else (order.order_type or '—')
@@ -95,43 +114,45 @@ def send_order_telegram(order):
 
     text = '\n'.join(lines)
 
-    api_base = f'https://api.telegram.org/bot{token}'
-
     try:
-        resp = requests.post(f'{api_base}/sendMessage', json={
-            'chat_id': chat_id,
-            'text': text,
-            'parse_mode': 'HTML',
-        }, timeout=10)
-        if resp.status_code == 200:
-            current_app.logger.info(f'Telegram notification sent for order #{order.id}')
-        else:
-            current_app.logger.error(f'Telegram API error for order #{order.id}: {resp.status_code} {resp.text}')
+        resp = client.send_message(chat_id, text)
     except Exception as e:
         current_app.logger.error(f'Telegram send FAILED for order #{order.id}: {type(e).__name__}: {e}')
+        return False
+    if resp.status_code != 200:
+        current_app.logger.error(f'Telegram API error for order #{order.id}: {resp.status_code} {resp.text}')
+        return False
+    current_app.logger.info(f'Telegram notification sent for order #{order.id}')
+    return True
 
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', '')
-    for file_field in [order.file_path, getattr(order, 'file_path_step3', '') or '']:
-        if not file_field:
-            continue
-        full_path = os.path.join(upload_folder, file_field) if upload_folder else file_field
-        if not os.path.isfile(full_path):
-            continue
-        try:
-            with open(full_path, 'rb') as f:
-                resp = requests.post(
-                    f'{api_base}/sendDocument',
-                    data={'chat_id': chat_id, 'caption': f'📎 Файл к заказу #{order.id}'},
-                    files={'document': (file_field, f)},
-                    timeout=30,
-                )
-            if resp.status_code == 200:
-                current_app.logger.info(f'Telegram file {file_field} sent for order #{order.id}')
-            else:
-                current_app.logger.error(f'Telegram file send error: {resp.status_code} {resp.text}')
-        except Exception as e:
-            current_app.logger.error(f'Telegram file send FAILED {file_field}: {type(e).__name__}: {e}')
 
+def send_order_telegram_files(order):
+    # Queued as its own notification so that a failed upload is retried
+    # without posting the order message again
+    client, chat_id = _client()
+    if client is None:
+        return False
+
+    documents = []
+    for file_field in order_files(order):
+        full_path = attachment_path(current_app.config, file_field)
+        if os.path.isfile(full_path):
+            documents.append((file_field, full_path))
+        else:
+            current_app.logger.warning(f'Telegram: file {file_field} of order #{order.id} is missing')
+    if not documents:
+        return True
+
+    label = 'Файлы' if len(documents) > 1 else 'Файл'
+    try:
+        resp = client.send_documents(chat_id, documents, caption=f'📎 {label} к заказу #{order.id}')
+    except Exception as e:
+        current_app.logger.error(f'Telegram file send FAILED for order #{order.id}: {type(e).__name__}: {e}')
+        return False
+    if resp.status_code != 200:
+        current_app.logger.error(f'Telegram file send error for order #{order.id}: {resp.status_code} {resp.text}')
+        return False
+    current_app.logger.info(f'Telegram: {len(documents)} file(s) sent for order #{order.id}')
     return True
 
 
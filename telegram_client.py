@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import outbound
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+
+
+class TelegramClient:
+    def __init__(self, token, api_url='https://api.telegram.org', global_rate=30,
+                 chat_rate=1, chat_burst=3, max_retries=3):
+        self.api_base = f'{api_url.rstrip("/")}/bot{token}'
+        self.max_retries = max_retries
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    def call(self, method, chat_id, data=None, files=None, timeout=10):
+        # files maps form field -> (filename, path); they are reopened on every attempt
+        chat_bucket = self._chat_bucket(chat_id)
+        payload = dict(data or {}, chat_id=chat_id)
+        resp = None
+        for _ in range(self.max_retries + 1):
+            chat_bucket.acquire()
+            self._global_bucket.acquire()
+            handles = {}
+            try:
+                for field, (filename, path) in (files or {}).items():
+                    handles[field] = (filename, open(path, 'rb'))
+                with outbound('http'):
+                    if handles:
+                        resp = self.session.post(f'{self.api_base}/{method}', data=payload,
+                                                 files=handles, timeout=timeout)
+                    else:
+                        resp = self.session.post(f'{self.api_base}/{method}', json=payload, timeout=timeout)
+            finally:
+                for _, fh in handles.values():
+                    fh.close()
+            if resp.status_code != 429:
+                return resp
+            chat_bucket.pause(_retry_after(resp))
+        return resp
+
+    def send_message(self, chat_id, text, parse_mode='HTML'):
+        return self.call('sendMessage', chat_id, {'text': text, 'parse_mode': parse_mode})
+
+    def send_documents(self, chat_id, documents, caption=''):
+        # documents is a list of (filename, path); several go out as one album
+        if not documents:
+            return None
+        if len(documents) == 1:
+            filename, path = documents[0]
+            return self.call('sendDocument', chat_id, {'caption': caption},
+                             files={'document': (filename, path)}, timeout=30)
+        media = []
+        files = {}
+        for i, (filename, path) in enumerate(documents[:10]):
+            field = f'file{i}'
+            media.append({'type': 'document', 'media': f'attach://{field}'})
+            files[field] = (filename, path)
+        media[-1]['caption'] = caption
+        return self.call('sendMediaGroup', chat_id, {'media': json.dumps(media, ensure_ascii=False)},
+                         files=files, timeout=30)
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.json().get('parameters', {}).get('retry_after', 1))
+    except (ValueError, AttributeError):
+        return 1.0
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(token, api_url='https://api.telegram.org', **options):
+    key = (token, api_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = TelegramClient(token, api_url=api_url, **options)
+            _clients[key] = client
+        return client
@@ -0,0 +1,92 @@
+import itertools
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# config.py reads the environment at import time, so point every piece of
+# on-disk state at a scratch directory before the app is imported.
+_TMP = tempfile.mkdtemp(prefix='pechati-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(_TMP, 'app.sqlite3'),
+    'SECRET_KEY': 'test-secret',
+    'AUTO_MIGRATE': 'true',
+    'WIZARD_STORE_DB': os.path.join(_TMP, 'wizard.sqlite3'),
+    'RATE_LIMIT_DB': os.path.join(_TMP, 'ratelimit.sqlite3'),
+    'CACHE_STAMP_FOLDER': os.path.join(_TMP, 'cache'),
+    'ATTACHMENT_FOLDER': os.path.join(_TMP, 'attachments'),
+    'NOTIFY_DISPATCH': 'worker',
+    'MAIL_PASSWORD': '',
+    'SITE_URL': '',
+    'TELEGRAM_BOT_TOKEN': '',
+    'TELEGRAM_CHAT_ID': '',
+    'ADMIN_USERNAME': 'admin',
+    'ADMIN_PASSWORD': 'admin-password',
+})
+
+_addresses = itertools.count(1)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, PAGE_CACHE_ENABLED=False)
+    return flask_app
+
+
+@pytest.fixture
+def db(app):
+    # A freshly seeded catalog with no orders for every test
+    import seed
+    from models import db as _db
+    seed.seed()
+    return _db
+
+
+@pytest.fixture
+def client(app, db):
+    # Each test gets its own address so the order rate limit never trips
+    n = next(_addresses)
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}'
+    return client
+
+
+@pytest.fixture
+def admin_client(app, db, client):
+    from models import Admin
+    with app.app_context():
+        admin_id = Admin.query.first().id
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(admin_id)
+        sess['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def make_order(app, db):
+    from models import Layout, Order, PriceOption, Product
+
+    def make(**fields):
+        with app.app_context():
+            product = Product.query.order_by(Product.id).first()
+            values = {
+                'product_id': product.id,
+                'layout_id': Layout.query.filter_by(product_id=product.id).first().id,
+                'price_option_id': PriceOption.query.filter_by(product_id=product.id).first().id,
+                'total_price': 1500,
+                'name': 'Иван Петров',
+                'phone': '+7 900 000-00-00',
+                'status': 'new',
+            }
+            values.update(fields)
+            order = Order(**values)
+            db.session.add(order)
+            db.session.commit()
+            return order.id
+    return make
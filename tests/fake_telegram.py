@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegram(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, chat_limit=30):
+        super().__init__(('127.0.0.1', 0), FakeTelegramHandler)
+        self.chat_limit = chat_limit
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.requests = []
+        self.failures = {}
+        self.throttled = 0
+        self.connections = set()
+        self._window = {}
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def fail(self, method, times=1):
+        with self.lock:
+            self.failures[method] = self.failures.get(method, 0) + times
+
+    def methods(self):
+        with self.lock:
+            return [method for method, _ in self.requests]
+
+    def allow(self, chat_id):
+        now = time.monotonic()
+        with self.lock:
+            recent = [t for t in self._window.get(chat_id, []) if now - t < 1.0]
+            if len(recent) >= self.chat_limit:
+                self._window[chat_id] = recent
+                self.throttled += 1
+                return False
+            recent.append(now)
+            self._window[chat_id] = recent
+            return True
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        method = self.path.rsplit('/', 1)[-1]
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.calls[method] = server.calls.get(method, 0) + 1
+            server.requests.append((method, body))
+            failing = server.failures.get(method, 0)
+            if failing:
+                server.failures[method] = failing - 1
+        if failing:
+            self._reply(400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: injected failure'})
+        # every caller here talks to a single chat, so one window covers every call
+        elif server.allow('1'):
+            self._reply(200, {'ok': True, 'result': {}})
+        else:
+            self._reply(429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 1}})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+@contextmanager
+def count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(engine, limit):
+    with count_queries(engine) as statements:
+        yield statements
+    if len(statements) > limit:
+        listing = '\n'.join(' '.join(s.split())[:160] for s in statements)
+        raise AssertionError(f'{len(statements)} queries, budget is {limit}:\n{listing}')
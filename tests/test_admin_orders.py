@@ -0,0 +1,36 @@
+import re
+
+from tests.query_count import count_queries
+
+
+def _total(response):
+    match = re.search(r'Всего: (\d+)', response.get_data(as_text=True))
+    return int(match.group(1)) if match else None
+
+
+def test_order_total_comes_from_status_counters(app, admin_client, make_order):
+    for status in ('new', 'new', 'new', 'done', 'cancelled'):
+        make_order(status=status)
+    from models import db
+    with app.app_context():
+        engine = db.engine
+
+    with count_queries(engine) as statements:
+        response = admin_client.get('/admin/orders')
+    assert _total(response) == 5
+    assert not any('count(' in s.lower() and 'from orders' in s.lower() for s in statements)
+
+    assert _total(admin_client.get('/admin/orders?status=new')) == 3
+    assert _total(admin_client.get('/admin/orders?status=in_progress')) == 0
+
+
+def test_order_total_follows_status_changes(app, admin_client, make_order):
+    order_id = make_order(status='new')
+    admin_client.post(f'/admin/orders/{order_id}/status', data={'status': 'done'})
+    assert _total(admin_client.get('/admin/orders?status=new')) == 0
+    assert _total(admin_client.get('/admin/orders?status=done')) == 1
+
+
+def test_searched_list_has_no_total(admin_client, make_order):
+    make_order(name='Ромашка')
+    assert _total(admin_client.get('/admin/orders?q=ромашка')) is None
@@ -0,0 +1,139 @@
+import email
+import logging
+import os
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from mail import send_order_email
+from mail_transport import OutgoingMessage, SMTPTransport
+from models import db, Order
+from uploads import stored_path
+
+
+class Inbox:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return '250 OK'
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    inbox = Inbox()
+    controller = Controller(inbox, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    inbox.controller = controller
+    yield inbox
+    inbox.controller.stop()
+
+
+def _transport(inbox, keepalive=60):
+    return SMTPTransport('127.0.0.1', inbox.controller.port, False, False, '', '',
+                         timeout=5, keepalive=keepalive)
+
+
+def _message(html='<p>Заказ</p>'):
+    return OutgoingMessage('shop@example.com', 'admin@example.com', 'Новый заказ #1', html)
+
+
+def test_transport_reuses_the_connection(smtp):
+    transport = _transport(smtp)
+    transport.send(_message())
+    server = transport._server
+    transport.send(_message())
+    assert transport._server is server
+    assert len(smtp.messages) == 2
+    transport.close()
+
+
+def test_transport_reconnects_after_server_disconnect(smtp):
+    transport = _transport(smtp)
+    transport.send(_message())
+    first = transport._server
+
+    # Restarting the server drops the idle connection the transport still
+    # believes is alive (the keepalive window skips the NOOP probe)
+    port = smtp.controller.port
+    smtp.controller.stop()
+    smtp.controller = Controller(smtp, hostname='127.0.0.1', port=port)
+    smtp.controller.start()
+
+    transport.send(_message('<p>второе</p>'))
+    assert transport._server is not first
+    assert len(smtp.messages) == 2
+    assert 'второе' in smtp.messages[1].get_payload(0).get_payload(decode=True).decode('utf-8')
+    transport.close()
+
+
+def test_attachment_is_streamed_as_base64(smtp, tmp_path):
+    data = os.urandom(300 * 1024 + 7)
+    path = tmp_path / 'layout.pdf'
+    path.write_bytes(data)
+    message = _message()
+    message.attach_file('layout.pdf', str(path))
+
+    transport = _transport(smtp)
+    transport.send(message)
+    transport.close()
+
+    received = smtp.messages[0]
+    html, attachment = received.get_payload()
+    assert html.get_payload(decode=True).decode('utf-8') == '<p>Заказ</p>'
+    assert attachment.get_filename() == 'layout.pdf'
+    assert attachment['Content-Transfer-Encoding'] == 'base64'
+    assert attachment.get_payload(decode=True) == data
+    lines = attachment.get_payload().splitlines()
+    assert all(len(line) == 76 for line in lines[:-1])
+    assert 0 < len(lines[-1]) <= 76
+
+
+@pytest.fixture
+def mail_config(app, smtp, monkeypatch):
+    for key, value in {'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': smtp.controller.port,
+                       'MAIL_USE_SSL': False, 'MAIL_USE_TLS': False,
+                       'MAIL_PASSWORD': 'secret', 'MAIL_ATTACHMENT_MAX_BYTES': 1024}.items():
+        monkeypatch.setitem(app.config, key, value)
+    return app.config
+
+
+@pytest.fixture
+def large_file_order(app, make_order):
+    name = 'f00dbabe.pdf'
+    path = stored_path(app.config['ATTACHMENT_FOLDER'], name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * 4096)
+    return make_order(file_path=name)
+
+
+def _send(app, order_id):
+    with app.app_context():
+        return send_order_email(db.session.get(Order, order_id))
+
+
+def test_large_file_is_linked_from_site_url(app, smtp, mail_config, large_file_order, monkeypatch):
+    monkeypatch.setitem(app.config, 'SITE_URL', 'https://pechati7.ru/')
+    assert _send(app, large_file_order)
+    parts = smtp.messages[0].get_payload()
+    assert len(parts) == 1
+    html = parts[0].get_payload(decode=True).decode('utf-8')
+    assert 'href="https://pechati7.ru/admin/uploads/f00dbabe.pdf"' in html
+
+
+def test_large_file_is_attached_with_a_warning_without_site_url(app, smtp, mail_config,
+                                                                large_file_order, caplog):
+    with caplog.at_level(logging.WARNING):
+        assert _send(app, large_file_order)
+    parts = smtp.messages[0].get_payload()
+    assert parts[1].get_payload(decode=True) == b'x' * 4096
+    assert 'SITE_URL is not set' in caplog.text
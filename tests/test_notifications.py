@@ -0,0 +1,140 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import notifications
+from models import db, Order, OrderNotification
+
+
+@pytest.fixture
+def senders(monkeypatch):
+    calls = []
+    results = {'email': True, 'telegram': True}
+
+    def sender(channel):
+        def send(order):
+            calls.append((channel, order.id))
+            result = results[channel]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return send
+
+    monkeypatch.setattr(notifications, 'CHANNELS', {c: sender(c) for c in results})
+    return calls, results
+
+
+@pytest.fixture
+def queued(app, make_order, senders):
+    def queue(**fields):
+        order_id = make_order(**fields)
+        with app.app_context():
+            order = db.session.get(Order, order_id)
+            notifications.enqueue_order_notifications(order)
+            db.session.commit()
+            return order_id, [n.id for n in order.notifications]
+    return queue
+
+
+def _get(notification_id):
+    return db.session.get(OrderNotification, notification_id)
+
+
+def test_enqueue_creates_one_pending_row_per_channel(app, queued):
+    _, ids = queued()
+    with app.app_context():
+        assert sorted(_get(i).channel for i in ids) == ['email', 'telegram']
+        assert all(_get(i).status == 'pending' for i in ids)
+
+
+def test_claim_leases_the_row(app, queued):
+    _, ids = queued()
+    with app.app_context():
+        claimed = notifications._claim_next([ids[0]])
+        assert claimed.id == ids[0]
+        assert claimed.next_attempt_at > datetime.utcnow() + timedelta(seconds=app.config['NOTIFY_LEASE'] - 5)
+        assert notifications._claim_next([ids[0]]) is None
+        assert notifications._claim_next().id == ids[1]
+
+
+def test_dispatch_sends_due_rows(app, queued, senders):
+    calls, _ = senders
+    order_id, ids = queued()
+    with app.app_context():
+        assert notifications.dispatch_due() == 2
+        assert sorted(calls) == [('email', order_id), ('telegram', order_id)]
+        assert all(_get(i).status == 'sent' and _get(i).sent_at for i in ids)
+        assert notifications.dispatch_due() == 0
+
+
+def test_failure_backs_off_then_gives_up(app, queued, senders):
+    calls, results = senders
+    results['telegram'] = RuntimeError('chat not found')
+    _, ids = queued()
+    with app.app_context():
+        notifications.dispatch_due()
+        notification = _get(ids[1])
+        assert notification.status == 'pending'
+        assert notification.attempts == 1
+        assert notification.last_error == 'RuntimeError: chat not found'
+        delay = notification.next_attempt_at - datetime.utcnow()
+        assert timedelta(seconds=25) < delay <= timedelta(seconds=app.config['NOTIFY_BACKOFF_BASE'])
+        assert notifications.dispatch_due() == 0
+
+        notification.attempts = app.config['NOTIFY_MAX_ATTEMPTS'] - 1
+        notification.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        notifications.dispatch_due()
+        assert _get(ids[1]).status == 'failed'
+        assert len(calls) == 3
+
+
+def test_backoff_is_capped(app):
+    with app.app_context():
+        assert notifications._backoff(1) == timedelta(seconds=app.config['NOTIFY_BACKOFF_BASE'])
+        assert notifications._backoff(50) == timedelta(seconds=app.config['NOTIFY_BACKOFF_MAX'])
+
+
+def test_retry_resets_a_failed_row(app, queued, senders):
+    _, results = senders
+    results['email'] = False
+    _, ids = queued()
+    with app.app_context():
+        notification = _get(ids[0])
+        notification.attempts = app.config['NOTIFY_MAX_ATTEMPTS'] - 1
+        db.session.commit()
+        notifications.dispatch_due()
+        assert _get(ids[0]).status == 'failed'
+
+        results['email'] = True
+        notifications.retry_notification(_get(ids[0]))
+        notifications.dispatch_due()
+        assert _get(ids[0]).status == 'sent'
+        assert _get(ids[0]).attempts == 1
+
+
+def test_dispatch_is_limited_to_ids_and_deadline(app, queued, senders):
+    calls, _ = senders
+    first_order, first_ids = queued()
+    queued()
+    with app.app_context():
+        assert notifications.dispatch_due(deadline=time.monotonic()) == 0
+        assert notifications.dispatch_due(ids=first_ids) == 2
+        assert {order_id for _, order_id in calls} == {first_order}
+
+
+@pytest.mark.parametrize('mode, sent', [('worker', 0), ('inline', 1)])
+def test_retry_route_dispatches_only_that_row_inline(app, admin_client, queued, senders, mode, sent):
+    calls, _ = senders
+    _, ids = queued()
+    queued()
+    app.config['NOTIFY_DISPATCH'] = mode
+    try:
+        response = admin_client.post(f'/admin/notifications/{ids[0]}/retry')
+        response.close()
+    finally:
+        app.config['NOTIFY_DISPATCH'] = 'worker'
+    assert len(calls) == sent
+    with app.app_context():
+        assert OrderNotification.query.filter_by(status='pending').count() == 4 - sent
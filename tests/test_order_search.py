@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from tests.query_count import count_queries
+
+
+@pytest.fixture
+def orders(make_order):
+    return {
+        'ooo': make_order(name='Анна Смирнова', phone='8 (902) 815-44-11',
+                          params_json=json.dumps({'org_name': 'ООО Ромашка', 'inn': '7701234567'})),
+        'ip': make_order(name='Пётр Иванов', phone='+7 903 111-22-33', email='ip@example.com',
+                         params_json=json.dumps({'org_name': 'ИП Иванов', 'inn': '500100732259'})),
+        'plain': make_order(name='Ян Ли', phone='+7 999 000-00-01'),
+    }
+
+
+def _search(app, q):
+    from models import Order
+    from order_search import order_search_filter
+    with app.app_context():
+        return {o.id for o in Order.query.filter(order_search_filter(q))}
+
+
+def _sql(app, q):
+    from models import db, Order
+    from order_search import order_search_filter
+    with app.app_context():
+        return str(Order.query.filter(order_search_filter(q)).statement.compile(db.engine))
+
+
+def test_empty_query_has_no_filter(app):
+    from order_search import order_search_filter
+    with app.app_context():
+        assert order_search_filter('   ') is None
+
+
+def test_fts_trigram_match(app, orders):
+    assert 'orders_fts' in _sql(app, 'ромашка')
+    assert _search(app, 'ромашка') == {orders['ooo']}
+    assert _search(app, 'машк') == {orders['ooo']}
+    assert _search(app, 'example.com') == {orders['ip']}
+
+
+def test_cyrillic_case_folding(app, orders):
+    assert _search(app, 'РОМАШКА') == {orders['ooo']}
+    assert _search(app, 'Пётр ИВАНОВ') == {orders['ip']}
+
+
+def test_inn(app, orders):
+    assert _search(app, '7701234567') == {orders['ooo']}
+    assert _search(app, '500100') == {orders['ip']}
+
+
+@pytest.mark.parametrize('q', ['+7 902 815-44-11', '89028154411', '8 902 815 44 11',
+                               '79028154411', '8902815', '902 815'])
+def test_phone_forms(app, orders, q):
+    assert _search(app, q) == {orders['ooo']}
+
+
+def test_short_query_falls_back_to_like(app, orders):
+    sql = _sql(app, 'ли')
+    assert 'orders_fts' not in sql
+    assert 'LIKE' in sql
+    assert _search(app, 'ЛИ') == {orders['plain']}
+    assert _search(app, '%') == set()
+
+
+def test_order_list_does_not_load_search_text(app, admin_client, orders):
+    from models import db
+    with app.app_context():
+        engine = db.engine
+    with count_queries(engine) as statements:
+        response = admin_client.get('/admin/orders?q=ромашка')
+    assert 'Смирнова' in response.get_data(as_text=True)
+    order_selects = [s for s in statements if s.lstrip().upper().startswith('SELECT') and 'FROM orders' in s]
+    assert order_selects
+    assert not any('orders.search_text AS' in s for s in order_selects)
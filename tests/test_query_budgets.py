@@ -0,0 +1,109 @@
+import json
+
+import pytest
+from flask import url_for
+
+from tests.query_count import assert_max_queries
+
+# SQL statements each view may issue once the settings, catalog and
+# order-config snapshots are cached. Right after an edit bumps them, a
+# request may reload each of them once on top of that.
+CACHE_FILLS = 3
+
+PUBLIC_BUDGETS = [
+    ('index', {}, 3),
+    ('catalog_all', {}, 3),
+    ('catalog', {'slug': 'ooo'}, 3),
+    ('about', {}, 3),
+    ('contacts', {}, 3),
+    ('delivery', {}, 3),
+    ('policy', {}, 3),
+    ('order', {}, 3),
+    ('order_success', {}, 3),
+    ('sitemap_xml', {}, 3),
+    ('sitemap_xml_gz', {}, 3),
+]
+
+ADMIN_BUDGETS = [
+    ('admin_dashboard', {}, 11),
+    ('admin_orders', {}, 4),
+    ('admin_orders', {'status': 'new'}, 4),
+    ('admin_orders', {'q': 'ООО'}, 4),
+    ('admin_products', {}, 4),
+    ('admin_product_add', {}, 3),
+    ('admin_categories', {}, 3),
+    ('admin_category_add', {}, 3),
+    ('admin_settings', {}, 3),
+    ('admin_price_import', {}, 1),
+]
+
+
+def _path(app, endpoint, args):
+    with app.test_request_context():
+        return url_for(endpoint, **args)
+
+
+def _check(app, client, path, budget, warm):
+    if warm:
+        client.get(path)
+    with assert_max_queries(_engine(app), budget if warm else budget + CACHE_FILLS):
+        response = client.get(path)
+    assert response.status_code == 200, path
+
+
+def _engine(app):
+    from models import db
+    with app.app_context():
+        return db.engine
+
+
+@pytest.fixture
+def orders(make_order):
+    ids = [make_order(status=status, params_json=json.dumps({'ooo': 'ООО Ромашка', 'inn': '7701234567'}))
+           for status in ('new', 'new', 'in_progress', 'done', 'cancelled')]
+    return ids
+
+
+@pytest.mark.parametrize('warm', [True, False], ids=['warm', 'cold'])
+@pytest.mark.parametrize('endpoint,args,budget', PUBLIC_BUDGETS)
+def test_public_view_budget(app, client, endpoint, args, budget, warm):
+    _check(app, client, _path(app, endpoint, args), budget, warm)
+
+
+@pytest.mark.parametrize('warm', [True, False], ids=['warm', 'cold'])
+@pytest.mark.parametrize('endpoint,args,budget', ADMIN_BUDGETS)
+def test_admin_view_budget(app, admin_client, orders, endpoint, args, budget, warm):
+    _check(app, admin_client, _path(app, endpoint, args), budget, warm)
+
+
+@pytest.mark.parametrize('warm', [True, False], ids=['warm', 'cold'])
+def test_order_detail_budget(app, admin_client, orders, warm):
+    _check(app, admin_client, _path(app, 'admin_order_detail', {'id': orders[0]}), 4, warm)
+
+
+@pytest.mark.parametrize('warm', [True, False], ids=['warm', 'cold'])
+def test_catalog_editing_budgets(app, admin_client, warm):
+    from models import Layout, PriceOption, Product
+    with app.app_context():
+        product = Product.query.order_by(Product.id).first()
+        paths = [
+            (_path(app, 'admin_product_edit', {'id': product.id}), 5),
+            (_path(app, 'admin_category_edit', {'id': product.category_id}), 3),
+            (_path(app, 'admin_price_add', {'product_id': product.id}), 3),
+            (_path(app, 'admin_layout_add', {'product_id': product.id}), 3),
+            (_path(app, 'admin_price_edit', {'id': PriceOption.query.filter_by(product_id=product.id).first().id}), 3),
+            (_path(app, 'admin_layout_edit', {'id': Layout.query.filter_by(product_id=product.id).first().id}), 3),
+        ]
+    for path, budget in paths:
+        _check(app, admin_client, path, budget, warm)
+
+
+@pytest.mark.parametrize('warm', [True, False], ids=['warm', 'cold'])
+def test_order_wizard_budgets(app, client, warm):
+    from models import Product
+    with app.app_context():
+        product_id = Product.query.filter_by(is_active=True).order_by(Product.id).first().id
+    for step in (1, 2, 3):
+        _check(app, client, _path(app, 'order_product', {'product_id': product_id, 'step': step}), 4, warm)
+    _check(app, client, _path(app, 'api_quote', {'product_id': product_id}), 1, warm)
+    _check(app, client, _path(app, 'api_quote', {'product_id': product_id, 'qty': 2, 'delivery': 1}), 1, warm)
@@ -0,0 +1,109 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import notifications
+from models import db, Order, OrderNotification
+from telegram_client import TelegramClient
+from tests.fake_telegram import FakeTelegram
+from uploads import stored_path
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    server = FakeTelegram().start()
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', 'TEST')
+    monkeypatch.setenv('TELEGRAM_CHAT_ID', '1')
+    monkeypatch.setenv('TELEGRAM_API_URL', server.url)
+    monkeypatch.setenv('TELEGRAM_CHAT_RATE', '100')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def order_with_files(app, make_order):
+    def make(*names):
+        for name in names:
+            path = stored_path(app.config['ATTACHMENT_FOLDER'], name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'%PDF-1.4 ' + name.encode())
+        fields = dict(zip(('file_path', 'file_path_step3'), names))
+        order_id = make_order(**fields)
+        with app.app_context():
+            order = db.session.get(Order, order_id)
+            notifications.enqueue_order_notifications(order)
+            db.session.commit()
+        return order_id
+    return make
+
+
+def _rows(order_id):
+    return {n.channel: n for n in OrderNotification.query.filter_by(order_id=order_id)}
+
+
+def test_files_are_a_separate_step_only_when_present(app, order_with_files):
+    plain = order_with_files()
+    with_files = order_with_files('a1b2c3d4.pdf')
+    with app.app_context():
+        assert set(_rows(plain)) == {'email', 'telegram'}
+        assert set(_rows(with_files)) == {'email', 'telegram', 'telegram_files'}
+        assert _rows(with_files)['telegram_files'].channel_label == 'Telegram (файлы)'
+
+
+def test_two_files_go_out_as_one_album(app, telegram, order_with_files):
+    order_id = order_with_files('a1b2c3d4.pdf', 'e5f6a7b8.png')
+    with app.app_context():
+        notifications.dispatch_due()
+        rows = _rows(order_id)
+        assert rows['telegram'].status == 'sent'
+        assert rows['telegram_files'].status == 'sent'
+    assert telegram.methods() == ['sendMessage', 'sendMediaGroup']
+    album = telegram.requests[1][1]
+    assert album.count(b'attach://file') == 2
+    assert b'a1b2c3d4.pdf' in album and b'e5f6a7b8.png' in album
+
+
+def test_single_file_is_sent_as_document(app, telegram, order_with_files):
+    order_with_files('a1b2c3d4.pdf')
+    with app.app_context():
+        notifications.dispatch_due()
+    assert telegram.methods() == ['sendMessage', 'sendDocument']
+
+
+def test_failed_upload_is_retried_without_the_message(app, telegram, order_with_files):
+    order_id = order_with_files('a1b2c3d4.pdf', 'e5f6a7b8.png')
+    telegram.fail('sendMediaGroup')
+    with app.app_context():
+        notifications.dispatch_due()
+        rows = _rows(order_id)
+        assert rows['telegram'].status == 'sent'
+        files = rows['telegram_files']
+        assert files.status == 'pending'
+        assert files.attempts == 1
+        assert files.last_error
+
+        files.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        notifications.dispatch_due()
+        assert _rows(order_id)['telegram_files'].status == 'sent'
+    assert telegram.methods() == ['sendMessage', 'sendMediaGroup', 'sendMediaGroup']
+
+
+def test_failed_message_is_not_reported_as_sent(app, telegram, order_with_files):
+    order_id = order_with_files()
+    telegram.fail('sendMessage')
+    with app.app_context():
+        notifications.dispatch_due()
+        assert _rows(order_id)['telegram'].status == 'pending'
+
+
+def test_client_waits_out_429(telegram):
+    telegram.chat_limit = 1
+    client = TelegramClient('TEST', api_url=telegram.url, chat_rate=100, chat_burst=5)
+    assert client.send_message('1', 'first').status_code == 200
+    assert client.send_message('1', 'second').status_code == 200
+    assert telegram.throttled == 1
+    assert telegram.calls == {'sendMessage': 3}
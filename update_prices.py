@@ -1,38 +1,68 @@
 import os
 import sys
+import csv
+import argparse
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db
-from models import Product
-
-prices = {
-    'Печать организации': 1550,
-    'Печать ИП': 1550,
-    'Печать врача': 1200,
-    'Печать по оттиску': 1800,
-    'Факсимиле': 1000,
-    
-    'Штамп 38x14 мм': 1000,
-    'Штамп 47x18 мм': 1100,
-    'Штамп 23x59 мм': 1300,
-    'Штамп 50x30 мм': 1600,
-    'Штамп 60x33 мм': 1600,
-    'Штамп 60x40 мм': 1800,
-    'Штамп 75x38 мм': 2100,
-}
-
-def update_prices():
+from app import app
+from price_import import COLUMNS, PriceImportError, apply_price_changes, export_price_rows, \
+    parse_price_file, plan_price_changes
+
+
+def print_diff(changes):
+    for c in changes:
+        kind = 'оснастка' if c.kind == 'option' else 'макет'
+        old = '—' if c.old is None else f'{c.old:g}'
+        print(f'{c.product} / {kind} «{c.item}»: {old} -> {c.new:g}')
+
+
+def update_prices(path, apply):
+    with open(path, 'rb') as f:
+        rows = parse_price_file(path, f.read())
     with app.app_context():
-        for product_name, price in prices.items():
-            product = Product.query.filter_by(name=product_name).first()
-            if product:
-                product.price = price
-                print(f"Updated price for {product_name}: {price} руб.")
-            else:
-                print(f"Product not found: {product_name}")
-        
-        db.session.commit()
-        print("All prices updated successfully!")
+        changes, errors = plan_price_changes(rows)
+        print_diff(changes)
+        for error in errors:
+            print(error)
+        print(f'{len(rows)} rows, {len(changes)} changes, {len(errors)} errors')
+        if errors:
+            print('Nothing applied: fix the errors first')
+            return False
+        if not apply:
+            print('Dry run, re-run with --apply to write the changes')
+            return True
+        if changes:
+            apply_price_changes(changes)
+        print(f'Applied {len(changes)} price changes')
+        return True
+
+
+def export_prices(path):
+    with app.app_context():
+        rows = export_price_rows()
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, delimiter=';')
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f'Exported {len(rows)} prices to {path}')
+
 
 if __name__ == '__main__':
-    update_prices()
+    parser = argparse.ArgumentParser(
+        description='Bulk-update option and layout prices from a CSV or JSON file '
+                    '(columns: product, osnastka_type, layout, price)'
+    )
+    parser.add_argument('file', help='Price list to import, or the target of --export')
+    parser.add_argument('--apply', action='store_true', help='Write the changes; default is a dry run')
+    parser.add_argument('--export', action='store_true', help='Write the current prices to FILE as CSV')
+    args = parser.parse_args()
+
+    if args.export:
+        export_prices(args.file)
+    else:
+        try:
+            ok = update_prices(args.file, args.apply)
+        except PriceImportError as e:
+            print(e)
+            ok = False
+        sys.exit(0 if ok else 1)
@@ -0,0 +1,134 @@
+import os
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import select
+
+from images import DERIVED_RE
+from models import db, Category, Layout, Order, PriceOption, Product, SiteSetting
+from uploads import stem
+
+
+REFERENCE_COLUMNS = (Category.image, Product.image, Layout.image, PriceOption.image,
+                     Order.file_path, Order.file_path_step3)
+DEFAULT_BATCH_SIZE = 500
+
+Orphan = namedtuple('Orphan', ['path', 'size', 'mtime', 'owner'])
+GCReport = namedtuple('GCReport', ['files', 'bytes', 'skipped'])
+
+
+def referenced_uploads():
+    names = set()
+    for column in REFERENCE_COLUMNS:
+        stmt = (select(column).where(column.is_not(None), column != '').distinct()
+                .execution_options(yield_per=5000))
+        names.update(db.session.execute(stmt).scalars())
+    logo = db.session.execute(
+        select(SiteSetting.value).where(SiteSetting.key == 'logo_path')
+    ).scalar()
+    if logo:
+        names.add(logo)
+    return names
+
+
+def _owner_stem(name):
+    # Resized variants and manifests belong to the original with the same stem
+    if DERIVED_RE.search(name):
+        return DERIVED_RE.sub('', name)
+    if name.endswith('.json'):
+        return name[:-5]
+    return None
+
+
+def _is_fresh(path, cutoff):
+    try:
+        return os.stat(path).st_mtime >= cutoff
+    except FileNotFoundError:
+        return False
+
+
+def find_orphans(folder, referenced, cutoff):
+    referenced_stems = {stem(n) for n in referenced}
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        originals = {stem(n): os.path.join(root, n) for n in files
+                     if not n.startswith('.') and _owner_stem(n) is None}
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            owner = None
+            if name.startswith('.'):
+                # Interrupted uploads leave .<uuid>.part behind; other dotfiles are ours
+                if not name.endswith('.part'):
+                    continue
+            elif name in referenced:
+                continue
+            else:
+                owner_stem = _owner_stem(name)
+                if owner_stem is not None:
+                    if owner_stem in referenced_stems:
+                        continue
+                    owner = originals.get(owner_stem)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if st.st_mtime < cutoff and not (owner and _is_fresh(owner, cutoff)):
+                yield Orphan(path, st.st_size, st.st_mtime, owner)
+
+
+def _delete_batch(batch, cutoff):
+    deleted = size = skipped = 0
+    for orphan in batch:
+        # An upload of identical bytes re-uses the file and touches it; don't
+        # race it, and keep variants whose original has come back in use.
+        if _is_fresh(orphan.path, cutoff) or (orphan.owner and _is_fresh(orphan.owner, cutoff)):
+            skipped += 1
+            continue
+        try:
+            os.remove(orphan.path)
+        except FileNotFoundError:
+            continue
+        deleted += 1
+        size += orphan.size
+    return deleted, size, skipped
+
+
+def _remove_empty_dirs(folder):
+    for root, dirs, files in os.walk(folder, topdown=False):
+        if root != folder and not os.listdir(root):
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass
+
+
+def collect_garbage(grace, apply=False, batch_size=DEFAULT_BATCH_SIZE, pause=0, on_orphan=None):
+    config = current_app.config
+    referenced = referenced_uploads()
+    cutoff = time.time() - grace
+    files = size = skipped = 0
+    for folder in (config['UPLOAD_FOLDER'], config['ATTACHMENT_FOLDER']):
+        if not os.path.isdir(folder):
+            continue
+        batch = []
+        for orphan in find_orphans(folder, referenced, cutoff):
+            if on_orphan:
+                on_orphan(orphan)
+            if not apply:
+                files += 1
+                size += orphan.size
+                continue
+            batch.append(orphan)
+            if len(batch) >= batch_size:
+                deleted, freed, fresh = _delete_batch(batch, cutoff)
+                files, size, skipped = files + deleted, size + freed, skipped + fresh
+                current_app.logger.info(f'Upload GC: deleted {files} files, {size} bytes so far')
+                batch = []
+                if pause:
+                    time.sleep(pause)
+        if batch:
+            deleted, freed, fresh = _delete_batch(batch, cutoff)
+            files, size, skipped = files + deleted, size + freed, skipped + fresh
+        if apply:
+            _remove_empty_dirs(folder)
+    return GCReport(files, size, skipped)
@@ -0,0 +1,102 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from flask import abort, current_app, send_file, url_for
+from werkzeug.security import safe_join
+
+
+# Uploads are named by their SHA-256, so the first hex digits already spread
+# files evenly: ab/cd/abcd....png. Any other name is fanned out by its hash.
+_DIGEST_STEM = re.compile(r'^[0-9a-f]{64}$')
+
+PUBLIC_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PRIVATE_CACHE_CONTROL = 'private, max-age=3600'
+
+
+def stem(filename):
+    return filename.rsplit('.', 1)[0]
+
+
+def upload_subdir(filename):
+    key = stem(filename)
+    if not _DIGEST_STEM.match(key):
+        key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return f'{key[:2]}/{key[2:4]}'
+
+
+def upload_relpath(filename):
+    return f'{upload_subdir(filename)}/{filename}'
+
+
+def upload_path(folder, filename):
+    return os.path.join(folder, *upload_relpath(filename).split('/'))
+
+
+def stored_path(folder, filename):
+    # Files written before the fan-out stay readable until they are moved
+    path = upload_path(folder, filename)
+    if not os.path.isfile(path):
+        legacy = os.path.join(folder, filename)
+        if os.path.isfile(legacy):
+            return legacy
+    return path
+
+
+def upload_url(filename):
+    return url_for('upload', filename=upload_relpath(filename))
+
+
+def send_stored_file(folder, relpath, internal_prefix, cache_control, as_attachment=False):
+    path = safe_join(folder, relpath)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    backend = current_app.config['SENDFILE_BACKEND']
+    if backend == 'nginx':
+        # nginx serves the bytes from an `internal` location and keeps our
+        # Content-Type, Content-Disposition and Cache-Control headers.
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        response.headers['X-Accel-Redirect'] = internal_prefix + quote(relpath.replace(os.sep, '/'))
+        if as_attachment:
+            response.headers['Content-Disposition'] = f'attachment; filename="{os.path.basename(path)}"'
+    else:
+        # With USE_X_SENDFILE (SENDFILE_BACKEND=sendfile) Flask emits an
+        # X-Sendfile header instead of the body; otherwise it streams the file.
+        response = send_file(path, as_attachment=as_attachment, conditional=True)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def send_upload(relpath):
+    folder = current_app.config['UPLOAD_FOLDER']
+    path = safe_join(folder, relpath)
+    if path is not None and not os.path.isfile(path):
+        relpath = os.path.basename(relpath)
+    return send_stored_file(folder, relpath, current_app.config['SENDFILE_UPLOADS_PREFIX'],
+                            PUBLIC_CACHE_CONTROL)
+
+
+def attachment_path(config, filename):
+    path = stored_path(config['ATTACHMENT_FOLDER'], filename)
+    if not os.path.isfile(path):
+        # Attachments saved before they were split from public uploads
+        legacy = stored_path(config['UPLOAD_FOLDER'], filename)
+        if os.path.isfile(legacy):
+            return legacy
+    return path
+
+
+def send_attachment(filename):
+    if '/' in filename or '\\' in filename:
+        abort(404)
+    config = current_app.config
+    path = attachment_path(config, filename)
+    if path.startswith(os.path.join(config['ATTACHMENT_FOLDER'], '')):
+        folder, prefix = config['ATTACHMENT_FOLDER'], config['SENDFILE_ATTACHMENTS_PREFIX']
+    else:
+        folder, prefix = config['UPLOAD_FOLDER'], config['SENDFILE_UPLOADS_PREFIX']
+    return send_stored_file(folder, os.path.relpath(path, folder), prefix,
+                            PRIVATE_CACHE_CONTROL, as_attachment=True)
@@ -0,0 +1,39 @@
+import os
+import sys
+import argparse
+import requests
+from flask import url_for
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from catalog_cache import get_catalog
+
+
+def page_paths():
+    with app.test_request_context():
+        paths = [url_for(endpoint) for endpoint in
+                 ('index', 'catalog_all', 'about', 'delivery', 'contacts', 'policy')]
+        paths += [url_for('catalog', slug=cat.slug) for cat in get_catalog().categories]
+    return paths
+
+
+def warm_pages(base_url, rounds):
+    base_url = base_url.rstrip('/')
+    paths = page_paths()
+    with requests.Session() as http:
+        for _ in range(rounds):
+            for path in paths:
+                try:
+                    resp = http.get(base_url + path, timeout=30, headers={'Connection': 'close'})
+                    print(f'{resp.status_code} {path}')
+                except requests.RequestException as e:
+                    print(f'FAILED {path}: {type(e).__name__}: {e}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render public pages into the page cache after a deploy')
+    parser.add_argument('base_url', help='Public site URL, e.g. https://pechati7.ru')
+    parser.add_argument('--rounds', type=int, default=4,
+                        help='Passes over the page list, so every gunicorn worker gets a copy')
+    args = parser.parse_args()
+    warm_pages(args.base_url, args.rounds)
@@ -0,0 +1,142 @@
+import json
+import os
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from flask import current_app, session
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, WizardState
+
+
+# Order wizard state lives server-side; the session cookie only carries an
+# opaque random id. Entries untouched for `ttl` seconds are treated as gone
+# and purged now and then on write.
+
+
+class SQLiteWizardStore:
+    def __init__(self, path, ttl, purge_every=200):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS wizard_states ('
+            'key TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_wizard_states_updated ON wizard_states (updated)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT data FROM wizard_states WHERE key = ? AND updated >= ?',
+            (key, time.time() - self.ttl),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO wizard_states (key, data, updated) VALUES (?, ?, ?)',
+                     (key, json.dumps(value, ensure_ascii=False), now))
+        if random.randrange(self.purge_every) == 0:
+            conn.execute('DELETE FROM wizard_states WHERE updated < ?', (now - self.ttl,))
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM wizard_states WHERE key = ?', (key,))
+
+
+class DatabaseWizardStore:
+    # Runs on its own connection so wizard writes never ride along with, or
+    # get rolled back by, the request's ORM transaction.
+    def __init__(self, ttl, purge_every=200):
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self.table = WizardState.__table__
+
+    def get(self, key):
+        t = self.table
+        with db.engine.connect() as conn:
+            data = conn.execute(
+                select(t.c.data).where(t.c.key == key, t.c.updated_at >= time.time() - self.ttl)
+            ).scalar()
+        return json.loads(data) if data is not None else None
+
+    def set(self, key, value):
+        t = self.table
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with db.engine.begin() as conn:
+            updated = conn.execute(update(t).where(t.c.key == key).values(data=data, updated_at=now))
+            if not updated.rowcount:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(t.insert().values(key=key, data=data, updated_at=now))
+                except IntegrityError:
+                    conn.execute(update(t).where(t.c.key == key).values(data=data, updated_at=now))
+            if random.randrange(self.purge_every) == 0:
+                conn.execute(delete(t).where(t.c.updated_at < now - self.ttl))
+
+    def delete(self, key):
+        t = self.table
+        with db.engine.begin() as conn:
+            conn.execute(delete(t).where(t.c.key == key))
+
+
+def make_wizard_store(config):
+    backend = config['WIZARD_STORE_BACKEND']
+    if backend == 'database':
+        return DatabaseWizardStore(config['WIZARD_STATE_TTL'])
+    if backend == 'sqlite':
+        return SQLiteWizardStore(config['WIZARD_STORE_DB'], config['WIZARD_STATE_TTL'])
+    raise ValueError(f'Unknown WIZARD_STORE_BACKEND: {backend}')
+
+
+_store_instance = None
+
+
+def _store():
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = make_wizard_store(current_app.config)
+    return _store_instance
+
+
+def _state_key(name, create=False):
+    sid = session.get('wizard_id')
+    if sid is None:
+        if not create:
+            return None
+        sid = session['wizard_id'] = secrets.token_urlsafe(24)
+    return f'{sid}:{name}'
+
+
+def load_wizard_state(name):
+    key = _state_key(name)
+    return (_store().get(key) if key else None) or {}
+
+
+def save_wizard_state(name, value):
+    _store().set(_state_key(name, create=True), value)
+
+
+def pop_wizard_state(name):
+    key = _state_key(name)
+    if key is None:
+        return {}
+    value = _store().get(key) or {}
+    _store().delete(key)
+    return value